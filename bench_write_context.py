@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Pomiar czasu po stronie serwera dla zapisów skanera z kontekstem
+wydajnościowym (CONFIG['write_context']) i bez niego
+Tworzy prawdziwe przyjęcia - uruchamiać na bazie testowej
+"""
+
+import argparse
+import contextlib
+import io
+import statistics
+import sys
+import time
+
+from skaner import CONFIG, OdooBarcode
+from odoo_standin import OdooStandIn
+
+
+class TimingProxy:
+    """Opakowanie ServerProxy mierzące czas każdego execute_kw"""
+
+    def __init__(self, proxy):
+        self.proxy = proxy
+        self.calls = []
+
+    def execute_kw(self, *args):
+        started = time.perf_counter()
+        try:
+            return self.proxy.execute_kw(*args)
+        finally:
+            self.calls.append((f'{args[3]}.{args[4]}', time.perf_counter() - started))
+
+
+def measure_round_trip(scanner, samples=20):
+    """Mediana czasu najtańszego wywołania - przybliżenie kosztu sieci i RPC"""
+    times = []
+    for _ in range(samples):
+        started = time.perf_counter()
+        scanner.models.execute_kw(
+            scanner.db, scanner.uid, scanner.password,
+            'res.users', 'check_access_rights',
+            ['read'], {'raise_exception': False}
+        )
+        times.append(time.perf_counter() - started)
+    return statistics.median(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark kontekstu zapisów skanera")
+    parser.add_argument('barcode', help="Kod kreskowy produktu użytego do przyjęć")
+    parser.add_argument('--scans', type=int, default=20,
+                        help="Liczba skanów na wariant (domyślnie 20)")
+    parser.add_argument('--local', action='store_true',
+                        help="Użyj lokalnego zastępczego serwera (sprawdzenie działania skryptu)")
+    parser.add_argument('--latency-ms', type=float, default=0.0,
+                        help="Sztuczne opóźnienie RPC lokalnego serwera w ms")
+    args = parser.parse_args()
+
+    standin = None
+    if args.local:
+        standin = OdooStandIn([args.barcode], latency=args.latency_ms / 1000).start()
+        url, db, username, password = standin.url, 'standin', 'admin', 'admin'
+    else:
+        url, db = CONFIG['url'], CONFIG['database']
+        username, password = CONFIG['username'], CONFIG['password']
+        confirm = input(f"Benchmark utworzy {2 * args.scans} przyjęć na {url} ({db}). "
+                        f"Używać tylko na bazie testowej. Kontynuować? (t/n): ")
+        if confirm.strip().lower() not in ['t', 'tak', 'y', 'yes']:
+            return
+
+    scanner = OdooBarcode(url, db, username, password,
+                          write_context=CONFIG['write_context'], lean_write_modes=())
+    product = scanner.find_product_by_barcode(args.barcode)
+    if not product:
+        print(f"Nie znaleziono produktu o kodzie: {args.barcode}")
+        sys.exit(1)
+
+    round_trip = measure_round_trip(scanner)
+    proxy = TimingProxy(scanner.models)
+    scanner._local.models = proxy
+
+    # Wyniki: wariant -> lista (czas skanu, szacowany czas serwera, liczba RPC)
+    results = {'pełny': [], 'lekki': []}
+    per_method = {'pełny': {}, 'lekki': {}}
+
+    for number in range(args.scans):
+        # Naprzemienna kolejność wariantów, żeby zmiany obciążenia serwera rozłożyły się równo
+        variants = ('pełny', 'lekki') if number % 2 == 0 else ('lekki', 'pełny')
+        for variant in variants:
+            scanner.lean_write_modes = {'single', 'multi'} if variant == 'lekki' else set()
+            proxy.calls.clear()
+            started = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                success = scanner.create_stock_move(product['id'], 1.0, 'in')
+            elapsed = time.perf_counter() - started
+            if not success:
+                print(f"✗ Nie udało się utworzyć przyjęcia ({variant})")
+                sys.exit(1)
+
+            server = sum(max(0.0, duration - round_trip) for _, duration in proxy.calls)
+            results[variant].append((elapsed, server, len(proxy.calls)))
+            for method, duration in proxy.calls:
+                per_method[variant].setdefault(method, []).append(max(0.0, duration - round_trip))
+
+    print("\n" + "=" * 60)
+    print("     KONTEKST ZAPISÓW - CZAS NA SKAN (mediana)")
+    print("=" * 60)
+    print(f"Serwer: {url} ({db}), skanów na wariant: {args.scans}")
+    print(f"Koszt pustego wywołania RPC: {round_trip * 1000:.1f} ms")
+    print(f"{'Wariant':<10}{'skan [ms]':>12}{'serwer [ms]':>14}{'RPC/skan':>10}")
+    medians = {}
+    for variant, rows in results.items():
+        medians[variant] = statistics.median(server for _, server, _ in rows)
+        print(f"{variant:<10}{statistics.median(e for e, _, _ in rows) * 1000:>12.1f}"
+              f"{medians[variant] * 1000:>14.1f}{statistics.median(c for _, _, c in rows):>10.0f}")
+
+    saved = medians['pełny'] - medians['lekki']
+    if medians['pełny'] > 0:
+        print(f"Oszczędność serwera na skan: {saved * 1000:.1f} ms ({saved / medians['pełny'] * 100:.0f}%)")
+
+    print(f"\n{'Wywołanie':<34}{'pełny [ms]':>12}{'lekki [ms]':>12}")
+    for method in per_method['pełny']:
+        full = statistics.median(per_method['pełny'][method]) * 1000
+        lean = statistics.median(per_method['lekki'].get(method, [0.0])) * 1000
+        print(f"{method:<34}{full:>12.1f}{lean:>12.1f}")
+
+    if standin:
+        standin.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Lokalny zastępczy serwer Odoo (XML-RPC) do testów obciążeniowych skanera
+Trzyma dane w pamięci i obsługuje tylko metody, których używa skaner.py
+"""
+
+import xmlrpc.client
+import threading
+import time
+import fnmatch
+from datetime import datetime
+from socketserver import ThreadingMixIn
+from xmlrpc.server import SimpleXMLRPCServer, SimpleXMLRPCRequestHandler
+
+# Metody zmieniające tylko stan dokumentu: metoda -> nowy stan
+STATE_METHODS = {
+    'action_confirm': 'confirmed',
+    'action_assign': 'assigned',
+    'button_plan': 'progress',
+    'button_validate': 'done',
+    'button_mark_done': 'done',
+    'action_cancel': 'cancel',
+}
+
+
+class _RequestHandler(SimpleXMLRPCRequestHandler):
+    rpc_paths = ('/xmlrpc/2/common', '/xmlrpc/2/object')
+
+    def log_message(self, format, *args):
+        pass
+
+
+class _ThreadingServer(ThreadingMixIn, SimpleXMLRPCServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+
+class OdooStandIn:
+    def __init__(self, barcodes=(), latency=0.0, stock=1000000.0, host='127.0.0.1', port=0,
+                 location_barcodes=()):
+        """
+        Tworzy serwer z minimalnym zestawem danych magazynowych
+
+        Args:
+            barcodes (iterable): Kody kreskowe produktów, które mają istnieć
+            latency (float): Sztuczne opóźnienie każdego wywołania w sekundach
+            stock (float): Stan początkowy każdego produktu w magazynie
+            host (str): Adres nasłuchiwania
+            port (int): Port (0 = dowolny wolny)
+            location_barcodes (iterable): Kody kreskowe dodatkowych lokalizacji wewnętrznych
+        """
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.records = {}
+        self.next_id = {}
+        self.calls = 0
+        self.done_moves = set()  # Ruchy, które już zmieniły stany magazynowe
+
+        self._seed(barcodes, stock, location_barcodes)
+
+        self.server = _ThreadingServer((host, port), requestHandler=_RequestHandler,
+                                       logRequests=False, allow_none=True)
+        self.server.register_function(self.authenticate, 'authenticate')
+        self.server.register_function(self.execute_kw, 'execute_kw')
+        self.url = f'http://{host}:{self.server.server_address[1]}'
+        self.thread = None
+
+    def _seed(self, barcodes, stock, location_barcodes=()):
+        """Dane startowe: lokalizacje, typy operacji, produkty i ich stany w każdej lokalizacji wewnętrznej"""
+        self._insert('stock.warehouse', {'id': 1, 'name': 'Magazyn', 'code': 'WH', 'lot_stock_id': 1})
+        self._insert('stock.location', {'id': 1, 'name': 'WH/Stock', 'complete_name': 'WH/Stock',
+                                        'usage': 'internal', 'barcode': 'WH-STOCK', 'warehouse_id': 1})
+        self._insert('stock.location', {'id': 2, 'name': 'Shelf 1', 'complete_name': 'WH/Stock/Shelf 1',
+                                        'usage': 'internal', 'barcode': 'WH-SHELF1', 'warehouse_id': 1})
+        self._insert('stock.location', {'id': 8, 'name': 'Vendors', 'complete_name': 'Partners/Vendors',
+                                        'usage': 'supplier', 'barcode': False, 'warehouse_id': False})
+        self._insert('stock.location', {'id': 9, 'name': 'Customers', 'complete_name': 'Partners/Customers',
+                                        'usage': 'customer', 'barcode': False, 'warehouse_id': False})
+        # Lokalizacje zeskanowane w nagraniu (przełączanie lokalizacji skanera)
+        known = {'WH-STOCK', 'WH-SHELF1'}
+        for barcode in sorted(set(location_barcodes) - known):
+            self._insert('stock.location', {'name': barcode, 'complete_name': f'WH/Stock/{barcode}',
+                                            'usage': 'internal', 'barcode': barcode, 'warehouse_id': 1})
+        self._insert('stock.picking.type', {'id': 1, 'name': 'Receipts', 'code': 'incoming', 'warehouse_id': 1})
+        self._insert('stock.picking.type', {'id': 2, 'name': 'Delivery Orders', 'code': 'outgoing', 'warehouse_id': 1})
+
+        for barcode in sorted(set(barcodes)):
+            product_id = self._insert('product.product', {
+                'name': f'Produkt {barcode}',
+                'barcode': barcode,
+                'uom_id': [1, 'Units'],
+            })
+            for location in self.records['stock.location'].values():
+                if location['usage'] == 'internal':
+                    self._insert('stock.quant', {'product_id': product_id, 'location_id': location['id'],
+                                                 'quantity': stock})
+
+    def _insert(self, model, vals):
+        table = self.records.setdefault(model, {})
+        record_id = vals.get('id') or self.next_id.get(model, 1)
+        self.next_id[model] = max(self.next_id.get(model, 1), record_id + 1)
+        record = dict(vals, id=record_id)
+        record.setdefault('create_date', datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S'))
+        table[record_id] = record
+        return record_id
+
+    # -------------------------------------------------------------------------
+    # Serwer
+    # -------------------------------------------------------------------------
+    def start(self):
+        """Uruchamia serwer w wątku w tle"""
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def authenticate(self, db, username, password, user_agent_env):
+        return 2
+
+    def execute_kw(self, db, uid, password, model, method, args, kwargs=None):
+        """Odpowiednik /xmlrpc/2/object execute_kw na danych w pamięci"""
+        kwargs = kwargs or {}
+        if self.latency:
+            time.sleep(self.latency)
+
+        with self.lock:
+            self.calls += 1
+
+            if method.startswith('_'):
+                raise xmlrpc.client.Fault(
+                    1, f"Private methods (such as {model}.{method}) cannot be called remotely.")
+
+            if method == 'search':
+                return [r['id'] for r in self._search(model, args[0], kwargs)]
+            if method == 'search_count':
+                return len(self._search(model, args[0], {}))
+            if method == 'search_read':
+                domain = args[0] if args else kwargs.get('domain', [])
+                records = self._search(model, domain, kwargs)
+                return [self._export(model, r, kwargs.get('fields')) for r in records]
+            if method == 'read':
+                ids = args[0] if isinstance(args[0], list) else [args[0]]
+                fields = args[1] if len(args) > 1 else kwargs.get('fields')
+                table = self.records.get(model, {})
+                return [self._export(model, table[i], fields) for i in ids if i in table]
+            if method == 'create':
+                vals = args[0]
+                if isinstance(vals, list):
+                    return [self._insert(model, dict(v)) for v in vals]
+                return self._insert(model, dict(vals))
+            if method == 'write':
+                for record in self._browse(model, args[0]):
+                    record.update(args[1])
+                    self._after_state_change(model, record)
+                return True
+            if method == 'check_access_rights':
+                return True
+            if method in STATE_METHODS:
+                for record in self._browse(model, args[0]):
+                    record['state'] = STATE_METHODS[method]
+                    self._after_state_change(model, record)
+                return True
+
+            raise xmlrpc.client.Fault(1, f"The method '{model}.{method}' does not exist")
+
+    # -------------------------------------------------------------------------
+    # Pomocnicze
+    # -------------------------------------------------------------------------
+    def _browse(self, model, ids):
+        ids = ids if isinstance(ids, list) else [ids]
+        table = self.records.get(model, {})
+        return [table[i] for i in ids if i in table]
+
+    def _after_state_change(self, model, record):
+        """Zakończenie dokumentu kończy jego ruchy i zapisuje datę wykonania"""
+        if record.get('state') == 'done':
+            record.setdefault('date_done', datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S'))
+        if model == 'stock.picking' and record.get('state') in ('done', 'cancel'):
+            for move in self.records.get('stock.move', {}).values():
+                if move.get('picking_id') == record['id']:
+                    move['state'] = record['state']
+                    self._after_state_change('stock.move', move)
+        if model == 'stock.move' and record.get('state') == 'done' and record['id'] not in self.done_moves:
+            self.done_moves.add(record['id'])
+            self._move_quants(record)
+    
+    def _move_quants(self, move):
+        """Przenosi ilość ruchu między quantami lokalizacji wewnętrznych (stan może zejść poniżej 0)"""
+        locations = self.records.get('stock.location', {})
+        quantity = move.get('product_uom_qty') or 0.0
+        for location_id, sign in ((move.get('location_id'), -1), (move.get('location_dest_id'), 1)):
+            if locations.get(location_id, {}).get('usage') != 'internal':
+                continue
+            quant = next((q for q in self.records.get('stock.quant', {}).values()
+                          if q['product_id'] == move.get('product_id') and q['location_id'] == location_id), None)
+            if quant is None:
+                self._insert('stock.quant', {'product_id': move.get('product_id'),
+                                             'location_id': location_id, 'quantity': sign * quantity})
+            else:
+                quant['quantity'] += sign * quantity
+
+    def _export(self, model, record, fields):
+        """Zwraca rekord tak jak Odoo - pola many2one jako [id, nazwa]"""
+        result = {}
+        for name in (fields or record.keys()):
+            value = record.get(name, False)
+            if name.endswith('_id') and isinstance(value, int) and not isinstance(value, bool):
+                value = [value, str(value)]
+            result[name] = value
+        result['id'] = record['id']
+        return result
+
+    def _search(self, model, domain, kwargs):
+        records = [r for r in self.records.get(model, {}).values()
+                   if all(self._match(r, leaf) for leaf in domain if leaf != '&')]
+        records.sort(key=lambda r: r['id'])
+        offset = kwargs.get('offset') or 0
+        limit = kwargs.get('limit')
+        return records[offset:offset + limit] if limit else records[offset:]
+
+    @staticmethod
+    def _match(record, leaf):
+        field, operator, value = leaf
+        actual = record.get(field, False)
+        if isinstance(actual, list):
+            actual = actual[0]
+        if operator == '=':
+            return actual == value
+        if operator == '!=':
+            return actual != value
+        if operator == 'in':
+            return actual in value
+        if operator == 'not in':
+            return actual not in value
+        if operator == 'like':
+            return isinstance(actual, str) and value in actual
+        if operator == 'ilike':
+            return isinstance(actual, str) and value.lower() in actual.lower()
+        if operator == '=like':
+            return isinstance(actual, str) and fnmatch.fnmatchcase(actual, value.replace('%', '*'))
+        if actual is False:
+            return False
+        if operator == '>':
+            return actual > value
+        if operator == '>=':
+            return actual >= value
+        if operator == '<':
+            return actual < value
+        if operator == '<=':
+            return actual <= value
+        raise xmlrpc.client.Fault(1, f"Unsupported operator {operator}")
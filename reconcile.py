@@ -0,0 +1,312 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Uzgadnianie dziennika operacji skanera z dokumentami w Odoo
+Pobiera partiami wszystkie przyjęcia, wydania i zlecenia produkcyjne utworzone
+przez jedno stanowisko skanera w podanym przedziale dat i zgłasza brakujące,
+zdublowane oraz niezakończone dokumenty
+"""
+
+import argparse
+import os
+import re
+import sys
+import xmlrpc.client
+from datetime import datetime, timedelta, timezone
+
+from skaner import CONFIG, OperationJournal, station_name
+
+# Typ operacji w dzienniku -> model dokumentu w Odoo
+OPERATION_MODELS = {
+    'stock_move_in': 'stock.picking',
+    'stock_move_out': 'stock.picking',
+    'production': 'mrp.production',
+}
+
+# Dokument spoza dziennika uznajemy za duplikat, jeśli ten sam produkt i ilość
+# zapisano w dzienniku w tym odstępie czasu (np. ponowny skan po zerwanym połączeniu)
+DUPLICATE_WINDOW = 120  # sekundy
+
+ISSUE_LABELS = {
+    'missing': "Brak w Odoo",
+    'duplicate': "Zdublowane w Odoo",
+    'stuck': "Niezakończone",
+    'mismatch': "Niezgodny produkt lub ilość",
+    'unlogged': "Spoza dziennika",
+}
+
+
+# 'Skaner - Przyjęcie - 2025-01-31 12:00:00 [PC1]' (nazwa stanowiska opcjonalna -
+# nie mają jej dokumenty sprzed jej wprowadzenia ani tworzone przez replay.py)
+ORIGIN_PATTERN = re.compile(r'^(.* - )(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2})(?: \[(.*)\])?$')
+
+
+def split_origin(origin):
+    """'Skaner - Przyjęcie - 2025-01-31 12:00:00 [PC1]' -> ('Skaner - Przyjęcie - ', datetime, 'PC1')"""
+    match = ORIGIN_PATTERN.match(origin or '')
+    if not match:
+        return origin, None, None
+    return match.group(1), datetime.strptime(match.group(2), "%Y-%m-%d %H:%M:%S"), match.group(3)
+
+
+class Reconciliation:
+    def __init__(self, url, db, username, password, station, chunk=500, details=20):
+        """
+        Args:
+            url (str): URL serwera Odoo
+            db (str): Nazwa bazy danych
+            username (str): Nazwa użytkownika
+            password (str): Hasło
+            station (str): Stanowisko skanera, którego dokumenty są sprawdzane
+            chunk (int): Liczba rekordów pobieranych jednym wywołaniem
+            details (int): Ile przykładów wypisać dla każdego rodzaju problemu
+        """
+        self.db = db
+        self.password = password
+        self.station = station
+        self.chunk = chunk
+        self.details = details
+
+        common = xmlrpc.client.ServerProxy(f'{url}/xmlrpc/2/common')
+        self.uid = common.authenticate(db, username, password, {})
+        if not self.uid:
+            raise Exception("Błąd uwierzytelniania")
+        self.models = xmlrpc.client.ServerProxy(f'{url}/xmlrpc/2/object')
+
+        # (model, id) -> operacja z dziennika
+        self.expected = {}
+        # (model, rodzaj operacji, product_id, ilość) -> [(czas, id)] z dziennika
+        self.signatures = {}
+        self.seen = set()
+
+        self.counts = {issue: 0 for issue in ISSUE_LABELS}
+        self.examples = {issue: [] for issue in ISSUE_LABELS}
+        self.checked = 0
+
+    def report(self, issue, message):
+        self.counts[issue] += 1
+        if len(self.examples[issue]) < self.details:
+            self.examples[issue].append(message)
+
+    # -------------------------------------------------------------------------
+    # Dziennik lokalny
+    # -------------------------------------------------------------------------
+    def load_journal(self, journal, start, end):
+        """Wczytuje operacje skanera z dziennika i zaznacza cofnięte"""
+        for entry in journal.read(start, end):
+            if entry.get('db') not in (None, self.db):
+                continue
+            if entry.get('station') not in (None, self.station):
+                continue
+
+            if entry['type'] == 'undo':
+                key = (OPERATION_MODELS.get(entry.get('undo_type')), entry['id'])
+                if key in self.expected:
+                    self.expected[key]['undone'] = True
+                continue
+
+            model = OPERATION_MODELS.get(entry['type'])
+            if not model:
+                continue
+            key = (model, entry['id'])
+            if key in self.expected:
+                self.report('duplicate', f"{model} {entry['id']}: zapisany w dzienniku więcej niż raz")
+                continue
+            self.expected[key] = entry
+            kind, created, _ = split_origin(entry.get('origin'))
+            signature = (model, kind, entry.get('product_id'), float(entry.get('qty') or 0))
+            self.signatures.setdefault(signature, []).append((created, entry['id']))
+
+    # -------------------------------------------------------------------------
+    # Odoo
+    # -------------------------------------------------------------------------
+    def iter_chunks(self, model, domain, fields):
+        """Pobiera rekordy partiami po ID (stała pamięć niezależnie od liczby dokumentów)"""
+        last_id = 0
+        while True:
+            records = self.models.execute_kw(
+                self.db, self.uid, self.password,
+                model, 'search_read',
+                [domain + [['id', '>', last_id]]],
+                {'fields': fields, 'limit': self.chunk, 'order': 'id'}
+            )
+            if not records:
+                return
+            yield records
+            last_id = records[-1]['id']
+
+    def attach_moves(self, pickings):
+        """Dołącza ruchy magazynowe do partii dokumentów jednym wywołaniem"""
+        moves = self.models.execute_kw(
+            self.db, self.uid, self.password,
+            'stock.move', 'search_read',
+            [[['picking_id', 'in', [p['id'] for p in pickings]]]],
+            {'fields': ['picking_id', 'product_id', 'product_uom_qty', 'state']}
+        )
+        by_picking = {}
+        for move in moves:
+            by_picking.setdefault(move['picking_id'][0], []).append(move)
+        for picking in pickings:
+            moves = by_picking.get(picking['id'], [])
+            picking['moves'] = moves
+            if moves:
+                picking['product_id'] = moves[0]['product_id']
+                picking['product_qty'] = sum(m['product_uom_qty'] for m in moves)
+
+    def check(self, model, record):
+        """Porównuje jeden dokument z Odoo z dziennikiem"""
+        key = (model, record['id'])
+        if key in self.seen:
+            return
+        self.seen.add(key)
+        # Dokumenty innych stanowisk sprawdzają ich własne dzienniki;
+        # dokumenty bez nazwy stanowiska (starsze) sprawdza każde stanowisko
+        _, _, station = split_origin(record.get('origin'))
+        if key not in self.expected and station not in (None, self.station):
+            return
+        self.checked += 1
+
+        label = f"{model} {record['id']} ({record.get('origin') or '-'})"
+        product_id = record['product_id'][0] if record.get('product_id') else None
+        quantity = float(record.get('product_qty') or 0)
+        entry = self.expected.get(key)
+
+        if entry is None:
+            if record['state'] == 'cancel':
+                return
+            kind, created, _ = split_origin(record.get('origin'))
+            for logged_at, logged_id in self.signatures.get((model, kind, product_id, quantity), []):
+                if created and logged_at and abs((created - logged_at).total_seconds()) <= DUPLICATE_WINDOW:
+                    self.report('duplicate', f"{label}: kopia dokumentu {logged_id} z dziennika")
+                    return
+            self.report('unlogged', f"{label}: stan {record['state']}, brak w dzienniku")
+            return
+
+        if entry.get('undone'):
+            if record['state'] != 'cancel':
+                self.report('stuck', f"{label}: cofnięty na skanerze, w Odoo stan {record['state']}")
+            return
+
+        if record['state'] != 'done':
+            self.report('stuck', f"{label}: stan {record['state']}")
+        elif any(move['state'] != 'done' for move in record.get('moves', [])):
+            self.report('stuck', f"{label}: dokument zakończony, ale nie wszystkie ruchy")
+
+        if product_id != entry.get('product_id') or abs(quantity - float(entry.get('qty') or 0)) > 1e-6:
+            self.report('mismatch', f"{label}: w Odoo {quantity} szt. produktu {product_id}, "
+                                    f"w dzienniku {entry.get('qty')} szt. produktu {entry.get('product_id')}")
+
+    def run(self, start, end):
+        """Pobiera dokumenty skanera z Odoo (daty w UTC, tak jak create_date) i je sprawdza"""
+        utc_start = start.astimezone(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+        utc_end = end.astimezone(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+        date_domain = [['create_date', '>=', utc_start], ['create_date', '<', utc_end]]
+
+        picking_fields = ['origin', 'state']
+        production_fields = ['origin', 'state', 'product_id', 'product_qty']
+
+        for pickings in self.iter_chunks('stock.picking',
+                                         [['origin', '=like', 'Skaner - %']] + date_domain,
+                                         picking_fields):
+            self.attach_moves(pickings)
+            for picking in pickings:
+                self.check('stock.picking', picking)
+            print(f"  ... sprawdzono {self.checked} dokumentów", end='\r')
+
+        for productions in self.iter_chunks('mrp.production',
+                                            [['origin', '=like', 'Skaner - Produkcja - %']] + date_domain,
+                                            production_fields):
+            for production in productions:
+                self.check('mrp.production', production)
+            print(f"  ... sprawdzono {self.checked} dokumentów", end='\r')
+
+        # Dokumenty z dziennika, których nie było w zapytaniu (np. zmienione origin)
+        not_seen = {}
+        for key in self.expected:
+            if key not in self.seen:
+                not_seen.setdefault(key[0], []).append(key[1])
+
+        for model, ids in not_seen.items():
+            fields = picking_fields if model == 'stock.picking' else production_fields
+            found = set()
+            for offset in range(0, len(ids), self.chunk):
+                records = self.models.execute_kw(
+                    self.db, self.uid, self.password,
+                    model, 'search_read',
+                    [[['id', 'in', ids[offset:offset + self.chunk]]]],
+                    {'fields': fields}
+                )
+                if model == 'stock.picking' and records:
+                    self.attach_moves(records)
+                for record in records:
+                    found.add(record['id'])
+                    self.check(model, record)
+            for record_id in ids:
+                if record_id not in found:
+                    entry = self.expected[(model, record_id)]
+                    self.report('missing', f"{model} {record_id} ({entry.get('origin') or '-'}): "
+                                           f"zapisany {entry['ts']}, nie istnieje w Odoo")
+
+    def print_summary(self, start, end):
+        print("\n" + "=" * 50)
+        print("     UZGODNIENIE SKANER ↔ ODOO")
+        print("=" * 50)
+        print(f"Stanowisko: {self.station}")
+        print(f"Okres: {start:%Y-%m-%d %H:%M} – {end:%Y-%m-%d %H:%M}")
+        print(f"Operacji w dzienniku: {len(self.expected)}, dokumentów sprawdzonych w Odoo: {self.checked}")
+        for issue, label in ISSUE_LABELS.items():
+            print(f"{label}: {self.counts[issue]}")
+            for message in self.examples[issue]:
+                print(f"  • {message}")
+            if self.counts[issue] > len(self.examples[issue]):
+                print(f"  ... i {self.counts[issue] - len(self.examples[issue])} więcej")
+        if not any(self.counts.values()):
+            print("✓ Dziennik zgodny z Odoo")
+
+
+def parse_day(value):
+    return datetime.strptime(value, "%Y-%m-%d")
+
+
+def main():
+    today = datetime.now().strftime("%Y-%m-%d")
+    parser = argparse.ArgumentParser(description="Uzgadnianie dziennika skanera z Odoo")
+    parser.add_argument('--from', dest='date_from', type=parse_day, default=parse_day(today),
+                        help="Pierwszy dzień (RRRR-MM-DD, domyślnie dziś)")
+    parser.add_argument('--to', dest='date_to', type=parse_day,
+                        help="Ostatni dzień włącznie (domyślnie taki sam jak --from)")
+    parser.add_argument('--journal', default=CONFIG.get('journal'),
+                        help="Szablon ścieżki dziennika względem katalogu domowego")
+    parser.add_argument('--station', default=station_name(),
+                        help="Stanowisko skanera (domyślnie z CONFIG albo nazwa komputera)")
+    parser.add_argument('--chunk', type=int, default=500,
+                        help="Liczba rekordów na jedno wywołanie (domyślnie 500)")
+    parser.add_argument('--details', type=int, default=20,
+                        help="Ile przykładów wypisać dla każdego problemu (domyślnie 20)")
+    args = parser.parse_args()
+
+    if not args.journal:
+        print("Dziennik operacji jest wyłączony w konfiguracji")
+        sys.exit(1)
+
+    start = args.date_from
+    end = (args.date_to or args.date_from) + timedelta(days=1)
+    journal_path = args.journal if os.path.isabs(args.journal) else f"~/{args.journal}"
+    journal = OperationJournal(os.path.expanduser(journal_path))
+
+    try:
+        reconciliation = Reconciliation(CONFIG['url'], CONFIG['database'],
+                                        CONFIG['username'], CONFIG['password'],
+                                        args.station, args.chunk, args.details)
+        reconciliation.load_journal(journal, start, end)
+        reconciliation.run(start, end)
+    except Exception as e:
+        print(f"✗ Błąd uzgadniania: {e}")
+        sys.exit(2)
+
+    reconciliation.print_summary(start, end)
+    sys.exit(1 if any(reconciliation.counts.values()) else 0)
+
+
+if __name__ == "__main__":
+    main()
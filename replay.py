@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Odtwarzanie nagranej sesji skanera (test obciążeniowy)
+Podaje zapisane skany do process_barcode z zachowaniem odstępów czasowych
+(1x, 10x lub bez czekania) na skonfigurowany serwer albo lokalny zastępczy serwer
+"""
+
+import argparse
+import contextlib
+import io
+import sys
+import time
+
+from skaner import CONFIG, OdooBarcode, load_session
+from odoo_standin import OdooStandIn
+
+# Wyniki skanów, które nie dotyczą istniejącego produktu
+NON_PRODUCT_OUTCOMES = ('mode', 'undo', 'undo_failed', 'no_mode', 'not_found', 'location')
+
+
+def percentile(values, fraction):
+    """Percentyl z posortowanej listy (bez interpolacji)"""
+    if not values:
+        return 0.0
+    index = min(len(values) - 1, int(round(fraction * (len(values) - 1))))
+    return values[index]
+
+
+def parse_speed(value):
+    """'1', '10', '10x' albo 'max' -> mnożnik prędkości (None = bez czekania)"""
+    value = value.lower()
+    if value == 'max':
+        return None
+    speed = float(value.rstrip('x×'))
+    if speed <= 0:
+        raise argparse.ArgumentTypeError("Prędkość musi być większa od 0")
+    return speed
+
+
+def replay(scanner, events, speed, quiet=False):
+    """
+    Odtwarza zdarzenia na podanym skanerze
+
+    Returns:
+        dict: Statystyki odtworzenia
+    """
+    answers = []
+
+    def replay_input(prompt):
+        # Odpowiedzi operatora z nagrania, brak odpowiedzi = pusty Enter
+        return answers.pop(0) if answers else ''
+
+    scanner.input_func = replay_input
+
+    latencies = []
+    mismatches = []
+    state_diffs = 0
+    max_lag = 0.0
+    started = time.monotonic()
+
+    # Komunikaty zapisów w tle pojawiają się też między skanami - wyciszamy całość
+    output = contextlib.redirect_stdout(io.StringIO()) if quiet else contextlib.nullcontext()
+    with output:
+        for number, event in enumerate(events, 1):
+            if speed is not None:
+                target = started + event['t'] / speed
+                delay = target - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                else:
+                    max_lag = max(max_lag, -delay)
+
+            if scanner.mode != event.get('m') or scanner.multi_mode != event.get('w', False):
+                state_diffs += 1
+
+            answers[:] = list(event.get('a', []))
+            scan_started = time.monotonic()
+            outcome = scanner.process_barcode(event['b'])
+            latencies.append(time.monotonic() - scan_started)
+
+            if outcome != event.get('o'):
+                mismatches.append((number, event['b'], event.get('o'), outcome))
+
+        # Zapisy w tle też liczą się do czasu odtworzenia
+        if scanner.scheduler:
+            scanner.scheduler.drain()
+
+    return {
+        'wall': time.monotonic() - started,
+        'latencies': sorted(latencies),
+        'mismatches': mismatches,
+        'state_diffs': state_diffs,
+        'max_lag': max_lag,
+        'writes': scanner.scheduler.stats() if scanner.scheduler else None,
+    }
+
+
+def print_report(events, stats):
+    """Wypisuje podsumowanie odtworzenia w porównaniu z nagraniem"""
+    recorded = sorted(event.get('d', 0.0) / 1000 for event in events)
+    latencies = stats['latencies']
+    recorded_span = events[-1]['t'] if events else 0.0
+
+    print("\n" + "=" * 50)
+    print("     PODSUMOWANIE ODTWORZENIA")
+    print("=" * 50)
+    print(f"Skanów: {len(events)}")
+    print(f"Czas nagrania: {recorded_span:.1f} s, czas odtworzenia: {stats['wall']:.1f} s")
+    if stats['wall'] > 0:
+        print(f"Przepustowość: {len(events) / stats['wall']:.1f} skanów/s")
+    print(f"Czas obsługi skanu [ms]      p50    p95    max")
+    print(f"  nagranie              {percentile(recorded, 0.5) * 1000:7.1f}"
+          f"{percentile(recorded, 0.95) * 1000:7.1f}{(recorded[-1] if recorded else 0) * 1000:7.1f}")
+    print(f"  odtworzenie           {percentile(latencies, 0.5) * 1000:7.1f}"
+          f"{percentile(latencies, 0.95) * 1000:7.1f}{(latencies[-1] if latencies else 0) * 1000:7.1f}")
+    if stats.get('writes'):
+        print(f"Zapisy w tle: {stats['writes']['completed']} wykonanych, "
+              f"{stats['writes']['failed']} z błędem")
+    if stats['max_lag'] > 0:
+        print(f"⚠ Maksymalne opóźnienie względem harmonogramu: {stats['max_lag']:.2f} s")
+    if stats['state_diffs']:
+        print(f"⚠ Stan trybów różny od nagrania przed {stats['state_diffs']} skanami")
+    if stats['mismatches']:
+        print(f"⚠ Inny wynik niż w nagraniu: {len(stats['mismatches'])} skanów")
+        for number, barcode, expected, actual in stats['mismatches'][:10]:
+            print(f"  #{number} {barcode}: {expected} → {actual}")
+    else:
+        print("✓ Wyniki zgodne z nagraniem")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Odtwarzanie nagranej sesji skanera")
+    parser.add_argument('session', help="Plik sesji (JSONL) nagrany przez skaner.py")
+    parser.add_argument('--speed', type=parse_speed, default=1.0,
+                        help="Prędkość odtwarzania: 1, 10 albo max (domyślnie 1)")
+    parser.add_argument('--local', action='store_true',
+                        help="Użyj lokalnego zastępczego serwera zamiast serwera z CONFIG")
+    parser.add_argument('--latency-ms', type=float, default=0.0,
+                        help="Sztuczne opóźnienie RPC lokalnego serwera w ms")
+    parser.add_argument('--workers', type=int, default=CONFIG.get('write_workers', 0),
+                        help="Liczba równoległych zapisów (0 = po kolei, domyślnie z CONFIG)")
+    parser.add_argument('--quiet', action='store_true',
+                        help="Nie wypisuj komunikatów skanera w trakcie odtwarzania")
+    args = parser.parse_args()
+
+    header, events = load_session(args.session)
+    if not events:
+        print("Brak zdarzeń w pliku sesji")
+        sys.exit(1)
+    print(f"Sesja z {header.get('start', '?')}: {len(events)} skanów, {events[-1]['t']:.1f} s")
+
+    standin = None
+    if args.local:
+        barcodes = [e['b'] for e in events if e.get('o') not in NON_PRODUCT_OUTCOMES]
+        locations = [e['b'] for e in events if e.get('o') == 'location']
+        standin = OdooStandIn(barcodes, latency=args.latency_ms / 1000,
+                              location_barcodes=locations).start()
+        url, db, username, password = standin.url, 'standin', 'admin', 'admin'
+        print(f"✓ Lokalny serwer zastępczy: {url}")
+    else:
+        url, db = CONFIG['url'], CONFIG['database']
+        username, password = CONFIG['username'], CONFIG['password']
+        confirm = input(f"Odtworzenie utworzy dokumenty na {url} ({db}). Kontynuować? (t/n): ")
+        if confirm.strip().lower() not in ['t', 'tak', 'y', 'yes']:
+            return
+
+    # Ten sam kontekst zapisów co skaner.py, żeby odtworzenie mierzyło rzeczywistą konfigurację
+    scanner = OdooBarcode(url, db, username, password,
+                          write_context=CONFIG.get('write_context'),
+                          lean_write_modes=CONFIG.get('lean_write_modes'),
+                          write_workers=args.workers)
+    stats = replay(scanner, events, args.speed, args.quiet)
+    print_report(events, stats)
+
+    if standin:
+        print(f"Wywołań RPC na serwerze zastępczym: {standin.calls}")
+        standin.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -11,7 +11,11 @@ import time
 import sys
 import os
 import subprocess
+import socket
 import threading
+import json
+import re
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime
 
 # =============================================================================
@@ -38,12 +42,507 @@ CONFIG = {
         # Nowe dźwięki zdejmowania
         'removed_one': 'skrypt/sounds/zdjelam.mp3',
         'removed_many': 'skrypt/sounds/zdjwiele.mp3'
-    }
+    },
+    
+    # Nagrywanie sesji (do odtwarzania przez replay.py) - pusty = wyłączone
+    # Ścieżka może zawierać znaczniki daty, np. 'skrypt/sesje/%Y-%m-%d.jsonl'
+    'session_log': '',
+    
+    # Zapamiętane możliwości serwera (które metody zatwierdzania działają)
+    'capabilities_cache': 'skrypt/.skaner_capabilities.json',
+    
+    # Dziennik operacji (jeden plik na dzień) - do uzgadniania przez reconcile.py
+    'journal': 'skrypt/dziennik/%Y-%m-%d.jsonl',
+    
+    # Nazwa stanowiska zapisywana w dzienniku i na końcu pola 'origin' dokumentów
+    # ('Skaner - Przyjęcie - <data> [nazwa]'), żeby uzgadniać każde stanowisko
+    # osobno (pusty = nazwa komputera)
+    'station': '',
+    
+    # Kontekst zapisów skanera - bez śledzenia zmian i wpisów w czacie,
+    # co znacznie skraca czas obsługi pojedynczego skanu na serwerze
+    'write_context': {
+        'tracking_disable': True,
+        'mail_create_nolog': True,
+        'mail_notrack': True,
+        'mail_auto_subscribe_no_notify': True,
+    },
+    # Tryby ilości, w których używany jest powyższy kontekst ('single', 'multi')
+    'lean_write_modes': ['single'],
+    
+    # Liczba równoległych zapisów do Odoo (0 = zapis od razu, po kolei)
+    'write_workers': 4,
+    
+    # Co ile sekund odświeżać w tle lokalizacje, magazyny i typy operacji (0 = nigdy)
+    'reference_refresh': 300
 }
 # =============================================================================
 
+# Metody sprawdzane przy pierwszym połączeniu z serwerem, w kolejności prób.
+# Gdy żadna nie działa, skaner ustawia stany dokumentów ręcznie ('write').
+CAPABILITY_METHODS = {
+    'validate_move': [
+        ('stock.move', '_action_done'),
+        ('stock.move', 'action_done'),
+        ('stock.picking', 'button_validate'),
+    ],
+    'plan_production': [
+        ('mrp.production', 'button_plan'),
+    ],
+}
+
+# Po tym czasie zapamiętane metody są sprawdzane ponownie przy połączeniu
+# (np. po aktualizacji Odoo lub doinstalowaniu modułu)
+CAPABILITY_CACHE_MAX_AGE = 7 * 24 * 3600  # sekundy
+
+# Błędy Odoo oznaczające, że metody nie da się wywołać przez XML-RPC. Pełne komunikaty,
+# bo samo 'does not exist' pasuje też do MissingError dla usuniętego rekordu
+UNAVAILABLE_PATTERNS = (
+    re.compile(r"The method '[\w.]+' does not exist"),
+    re.compile(r"Private methods \(such as [\w.]+\) cannot be called remotely"),
+)
+
+def station_name():
+    """Nazwa stanowiska skanera z konfiguracji albo nazwa komputera"""
+    return CONFIG.get('station') or socket.gethostname()
+
+class SessionRecorder:
+    """
+    Zapisuje przebieg sesji skanowania do pliku JSONL - jedna linia na skan.
+    Pierwsza linia to nagłówek sesji, kolejne to zdarzenia o krótkich kluczach:
+    t - sekundy od początku sesji do nadejścia skanu, b - kod, m - tryb, w - tryb wiele,
+    a - odpowiedzi operatora, o - wynik, d - czas obsługi w ms, ops - operacje
+    """
+    
+    def __init__(self, path, header=None):
+        """
+        Args:
+            path (str): Ścieżka pliku sesji (dopisywanie na końcu)
+            header (dict): Dodatkowe dane zapisywane w nagłówku sesji
+        """
+        self.path = path
+        self.started = time.monotonic()
+        self.lock = threading.Lock()
+        
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.file = open(path, 'a', encoding='utf-8')
+        
+        self.write(dict({'v': 1, 'start': datetime.now().isoformat(timespec='seconds')}, **(header or {})))
+    
+    def write(self, entry):
+        """Dopisuje jedną linię do pliku i od razu ją zrzuca na dysk"""
+        line = json.dumps(entry, ensure_ascii=False, separators=(',', ':'))
+        try:
+            with self.lock:
+                self.file.write(line + '\n')
+                self.file.flush()
+        except OSError as e:
+            print(f"⚠ Nie można zapisać nagrania sesji: {e}")
+    
+    def record(self, barcode, mode, multi_mode, answers, outcome, duration, ops=None):
+        """
+        Zapisuje jeden skan
+        
+        Args:
+            barcode (str): Zeskanowany kod
+            mode (str): Tryb przed skanem ('add', 'remove' lub None)
+            multi_mode (bool): Czy tryb wiele był włączony przed skanem
+            answers (list): Odpowiedzi wpisane przez operatora w trakcie skanu
+            outcome (str): Wynik obsługi skanu
+            duration (float): Czas obsługi w sekundach
+            ops (list): Operacje Odoo utworzone lub cofnięte w trakcie skanu
+        """
+        # Moment nadejścia skanu (nie zakończenia), żeby odtworzenie zachowało odstępy między skanami
+        entry = {
+            't': round(time.monotonic() - duration - self.started, 3),
+            'b': barcode,
+            'm': mode,
+            'w': multi_mode,
+            'o': outcome,
+            'd': round(duration * 1000, 1),
+        }
+        if answers:
+            entry['a'] = answers
+        if ops:
+            entry['ops'] = ops
+        self.write(entry)
+    
+    def record_write(self, barcode, outcome, duration, ops=None):
+        """Zapisuje zakończenie zapisu wykonanego w tle (klucz 'job' zamiast 'b')"""
+        entry = {
+            't': round(time.monotonic() - self.started, 3),
+            'job': barcode,
+            'o': outcome,
+            'd': round(duration * 1000, 1),
+        }
+        if ops:
+            entry['ops'] = ops
+        self.write(entry)
+    
+    def close(self):
+        with self.lock:
+            self.file.close()
+
+def load_session(path):
+    """
+    Wczytuje nagraną sesję
+    
+    Returns:
+        tuple: (nagłówek, lista zdarzeń)
+    """
+    header = {}
+    events = []
+    offset = 0.0
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            entry = json.loads(line)
+            if 'v' in entry:
+                # Kolejne sesje dopisane do tego samego pliku - czas liczony od nowa
+                offset = events[-1]['t'] if events else 0.0
+                header = header or entry
+                continue
+            if 'b' not in entry:
+                # Zakończenie zapisu w tle - nie jest skanem
+                continue
+            entry['t'] = entry['t'] + offset
+            events.append(entry)
+    return header, events
+
+class OperationJournal:
+    """
+    Trwały dziennik operacji wykonanych przez skaner (JSONL, plik na dzień).
+    W przeciwieństwie do historii cofania nie jest przycinany - służy do
+    uzgadniania dokumentów z Odoo na koniec dnia (reconcile.py).
+    """
+    
+    def __init__(self, path_template):
+        """
+        Args:
+            path_template (str): Ścieżka ze znacznikami daty, np. '.../%Y-%m-%d.jsonl'
+        """
+        self.path_template = path_template
+        self.lock = threading.Lock()
+    
+    def write(self, entry):
+        """Dopisuje operację do pliku bieżącego dnia"""
+        now = datetime.now()
+        entry = dict({'ts': now.strftime("%Y-%m-%d %H:%M:%S")}, **entry)
+        line = json.dumps(entry, ensure_ascii=False, separators=(',', ':'))
+        path = now.strftime(self.path_template)
+        # Błąd dziennika nie może zmienić wyniku zapisu, który już się udał w Odoo
+        try:
+            with self.lock:
+                directory = os.path.dirname(path)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                with open(path, 'a', encoding='utf-8') as f:
+                    f.write(line + '\n')
+        except OSError as e:
+            print(f"⚠ Nie można zapisać dziennika operacji: {e}")
+    
+    def read(self, start, end):
+        """
+        Zwraca kolejno operacje z przedziału [start, end)
+        
+        Args:
+            start (datetime): Początek przedziału
+            end (datetime): Koniec przedziału
+        """
+        start_ts = start.strftime("%Y-%m-%d %H:%M:%S")
+        end_ts = end.strftime("%Y-%m-%d %H:%M:%S")
+        
+        # Pliki wszystkich dni z przedziału (bez powtórzeń gdy szablon nie ma daty)
+        paths = []
+        day = datetime(start.year, start.month, start.day)
+        while day < end:
+            path = day.strftime(self.path_template)
+            if path not in paths:
+                paths.append(path)
+            day = datetime.fromordinal(day.toordinal() + 1)
+        
+        for path in paths:
+            if not os.path.exists(path):
+                continue
+            with open(path, encoding='utf-8') as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    entry = json.loads(line)
+                    if start_ts <= entry['ts'] < end_ts:
+                        yield entry
+
+class WriteScheduler:
+    """
+    Wykonuje zapisy do Odoo w puli wątków.
+    Zapisy z różnymi kluczami (produktami) idą równolegle, z tym samym kluczem -
+    ściśle w kolejności zgłoszenia. Zadanie-bariera (cofnięcie) startuje dopiero
+    po zakończeniu wszystkich wcześniejszych i wstrzymuje wszystkie późniejsze.
+    """
+    
+    BARRIER = object()
+    
+    def __init__(self, workers):
+        """
+        Args:
+            workers (int): Maksymalna liczba równoległych zapisów
+        """
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.lock = threading.Lock()
+        self.changed = threading.Condition(self.lock)
+        self.queue = []  # Zadania czekające, w kolejności zgłoszenia
+        self.running = []  # Zadania przekazane do puli wątków
+        self.completed = 0
+        self.failed = 0
+    
+    def submit(self, key, func, barrier=False):
+        """
+        Zgłasza zapis
+        
+        Args:
+            key: Klucz kolejności (np. ID produktu)
+            func (callable): Zapis - zwraca False lub rzuca wyjątek przy błędzie
+            barrier (bool): Czy zadanie ma być wykonane w pełnej izolacji
+            
+        Returns:
+            Future: Wynik funkcji
+        """
+        job = (self.BARRIER if barrier else key, func, Future())
+        with self.lock:
+            self.queue.append(job)
+            self._dispatch()
+        return job[2]
+    
+    def _dispatch(self):
+        """Uruchamia wszystkie zadania, które mogą już ruszyć (wywoływane pod blokadą)"""
+        busy_keys = {job[0] for job in self.running}
+        # Trwająca bariera wstrzymuje też zadania zgłoszone już po jej starcie
+        if self.BARRIER in busy_keys:
+            return
+        for job in list(self.queue):
+            key = job[0]
+            if key is self.BARRIER:
+                if job is self.queue[0] and not self.running:
+                    self._start(job)
+                # Nic zgłoszonego po barierze nie może wyprzedzić
+                break
+            if key in busy_keys:
+                continue
+            busy_keys.add(key)
+            self._start(job)
+    
+    def _start(self, job):
+        self.queue.remove(job)
+        self.running.append(job)
+        self.executor.submit(self._run, job)
+    
+    def _run(self, job):
+        key, func, future = job
+        error = None
+        result = None
+        try:
+            result = func()
+        except Exception as e:
+            error = e
+        
+        with self.lock:
+            self.running.remove(job)
+            self.completed += 1
+            if error is not None or result is False:
+                self.failed += 1
+            self._dispatch()
+            self.changed.notify_all()
+        
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+    
+    @property
+    def in_flight(self):
+        """Liczba zapisów czekających lub wykonywanych"""
+        with self.lock:
+            return len(self.queue) + len(self.running)
+    
+    def stats(self):
+        with self.lock:
+            return {
+                'in_flight': len(self.queue) + len(self.running),
+                'completed': self.completed,
+                'failed': self.failed,
+            }
+    
+    def wait_for(self, key):
+        """Czeka na zakończenie wszystkich zgłoszonych zapisów z danym kluczem"""
+        with self.lock:
+            self.changed.wait_for(lambda: not any(
+                job[0] == key or job[0] is self.BARRIER for job in self.queue + self.running))
+    
+    def drain(self):
+        """Czeka na zakończenie wszystkich zgłoszonych zapisów"""
+        with self.lock:
+            self.changed.wait_for(lambda: not self.queue and not self.running)
+
+class ReferenceIndex:
+    """
+    Lokalna kopia danych referencyjnych Odoo: lokalizacje wewnętrzne (z kodami
+    kreskowymi), lokalizacje dostawców i klientów, magazyny oraz typy operacji.
+    Wczytywana przy połączeniu i odświeżana w tle, dzięki czemu skan nie
+    potrzebuje osobnych zapytań o lokalizacje i typy operacji.
+    """
+    
+    def __init__(self, execute):
+        """
+        Args:
+            execute (callable): execute(model, method, args, kwargs) -> wynik execute_kw
+        """
+        self.execute = execute
+        self.data = None  # Podmieniane w całości przy odświeżeniu
+        self._stop = threading.Event()
+        self._thread = None
+    
+    def load(self):
+        """Wczytuje wszystkie dane referencyjne (kilka zapytań zamiast kilku na skan)"""
+        locations = self.execute(
+            'stock.location', 'search_read',
+            [[['usage', 'in', ['internal', 'supplier', 'customer']]]],
+            {'fields': ['id', 'name', 'complete_name', 'barcode', 'usage', 'warehouse_id'],
+             'order': 'complete_name, id'}
+        )
+        warehouses = self.execute(
+            'stock.warehouse', 'search_read',
+            [[]],
+            {'fields': ['id', 'name', 'code', 'lot_stock_id']}
+        )
+        picking_types = self.execute(
+            'stock.picking.type', 'search_read',
+            [[['code', 'in', ['incoming', 'outgoing']]]],
+            {'fields': ['id', 'code', 'warehouse_id'], 'order': 'sequence, id'}
+        )
+        
+        data = {
+            'locations': {},
+            'barcodes': {},
+            'internal': [],
+            'supplier': None,
+            'customer': None,
+            'warehouses': {w['id']: w for w in warehouses},
+            'picking_types': {},
+        }
+        for location in locations:
+            data['locations'][location['id']] = location
+            if location['usage'] == 'internal':
+                data['internal'].append(location['id'])
+                if location.get('barcode'):
+                    data['barcodes'][location['barcode']] = location
+            elif data[location['usage']] is None:
+                data[location['usage']] = location['id']
+        for picking_type in picking_types:
+            warehouse_id = picking_type['warehouse_id'][0] if picking_type.get('warehouse_id') else None
+            data['picking_types'].setdefault((picking_type['code'], warehouse_id), picking_type['id'])
+            data['picking_types'].setdefault((picking_type['code'], None), picking_type['id'])
+        
+        self.data = data
+        return data
+    
+    def start_refresh(self, interval):
+        """Odświeża dane w tle co podaną liczbę sekund"""
+        def refresh_loop():
+            while not self._stop.wait(interval):
+                try:
+                    self.load()
+                except Exception as e:
+                    # Zostają poprzednie dane - spróbujemy przy następnym odświeżeniu
+                    print(f"⚠ Nie udało się odświeżyć danych referencyjnych: {e}")
+        
+        self._thread = threading.Thread(target=refresh_loop)
+        self._thread.daemon = True
+        self._thread.start()
+    
+    def stop(self):
+        self._stop.set()
+    
+    def location_by_barcode(self, barcode):
+        """Lokalizacja wewnętrzna o danym kodzie kreskowym lub None"""
+        return self.data['barcodes'].get(barcode) if self.data else None
+    
+    def default_location(self):
+        """Pierwsza lokalizacja wewnętrzna (jak domyślne sortowanie Odoo)"""
+        if not self.data or not self.data['internal']:
+            return None
+        return self.data['locations'][self.data['internal'][0]]
+    
+    def partner_location(self, usage):
+        """ID lokalizacji dostawcy ('supplier') lub klienta ('customer')"""
+        return self.data[usage] if self.data else None
+    
+    def picking_type(self, code, location_id=None):
+        """
+        ID typu operacji - najpierw z magazynu podanej lokalizacji, potem dowolny
+        
+        Args:
+            code (str): 'incoming' lub 'outgoing'
+            location_id (int): Lokalizacja, której magazyn ma być użyty
+        """
+        if not self.data:
+            return None
+        location = self.data['locations'].get(location_id)
+        if location and location.get('warehouse_id'):
+            picking_type = self.data['picking_types'].get((code, location['warehouse_id'][0]))
+            if picking_type:
+                return picking_type
+        return self.data['picking_types'].get((code, None))
+
+class LazyProduct(dict):
+    """
+    Dane produktu, w których 'qty_available' jest pobierane dopiero przy
+    pierwszym odczycie (albo wcześniej w tle przez prefetch).
+    Stan jest potrzebny tylko przy sprawdzaniu dostępności w trybie zdejmowania.
+    """
+    
+    def __init__(self, data, qty_loader):
+        """
+        Args:
+            data (dict): Dane produktu z Odoo
+            qty_loader (callable): Funkcja zwracająca stan magazynowy produktu
+        """
+        super().__init__(data)
+        self._qty_loader = qty_loader
+        self._qty_future = None
+    
+    def prefetch(self, executor):
+        """Rozpoczyna pobieranie stanu w tle"""
+        if self._qty_future is None and 'qty_available' not in self:
+            self._qty_future = executor.submit(self._qty_loader)
+    
+    def qty_if_ready(self):
+        """Zwraca stan jeśli jest już znany, bez czekania (None gdy jeszcze nie)"""
+        if 'qty_available' in self:
+            return dict.__getitem__(self, 'qty_available')
+        if self._qty_future is not None and self._qty_future.done():
+            return self['qty_available']
+        return None
+    
+    def __missing__(self, key):
+        if key != 'qty_available':
+            raise KeyError(key)
+        if self._qty_future is not None:
+            value = self._qty_future.result()
+        else:
+            value = self._qty_loader()
+        self['qty_available'] = value
+        return value
+
 class OdooBarcode:
-    def __init__(self, url, db, username, password, sound_paths=None):
+    def __init__(self, url, db, username, password, sound_paths=None, session_log=None,
+                 capabilities_cache=None, journal=None, write_context=None,
+                 lean_write_modes=('single',), write_workers=0, reference_refresh=0,
+                 station=None):
         """
         Inicjalizacja połączenia z Odoo
         
@@ -53,16 +552,35 @@ class OdooBarcode:
             username (str): Nazwa użytkownika
             password (str): Hasło
             sound_paths (dict): Ścieżki do plików dźwiękowych
+            session_log (str): Ścieżka pliku do nagrywania sesji (None = bez nagrywania)
+            capabilities_cache (str): Plik z zapamiętanymi możliwościami serwera
+            journal (str): Szablon ścieżki dziennika operacji (None = bez dziennika)
+            write_context (dict): Kontekst Odoo dla zapisów (np. tracking_disable)
+            lean_write_modes (iterable): Tryby ilości ('single', 'multi') używające write_context
+            write_workers (int): Liczba równoległych zapisów (0 = zapis od razu w pętli skanowania)
+            reference_refresh (int): Co ile sekund odświeżać dane referencyjne w tle (0 = nigdy)
+            station (str): Nazwa stanowiska w dzienniku i na końcu pola 'origin' (None = bez nazwy)
         """
         self.url = url
         self.db = db
         self.username = username
         self.password = password
         self.uid = None
-        self.models = None
+        self._local = threading.local()  # Osobne połączenie XML-RPC dla każdego wątku
         self.mode = None  # 'add' lub 'remove'
         self.location_id = None  # ID lokalizacji magazynowej
         
+        # Lokalizacje, magazyny i typy operacji trzymane lokalnie
+        self.reference_refresh = reference_refresh
+        self.references = ReferenceIndex(
+            lambda model, method, args, kwargs: self.models.execute_kw(
+                self.db, self.uid, self.password, model, method, args, kwargs))
+        
+        # Działające metody serwera (sprawdzane raz na serwer)
+        self.capabilities_cache = capabilities_cache
+        self.capabilities = {}
+        self.capabilities_lock = threading.RLock()  # Zapisy w tle aktualizują je równolegle
+        
         # Kody kreskowe do przełączania trybu
         self.ADD_MODE_BARCODE = "dodajetowar"
         self.REMOVE_MODE_BARCODE = "zdejmujetowar"
@@ -77,8 +595,26 @@ class OdooBarcode:
         # Flagi trybów
         self.multi_mode = False  # Czy pytać o ilość
         
-        # Historia operacji (do cofania)
+        # Kontekst zapisów dla trybów o dużej liczbie skanów
+        self.lean_context = dict(write_context or {})
+        self.lean_write_modes = set(lean_write_modes or ())
+        
+        # Historia operacji (do cofania) - kolejność zgłoszenia, nie zakończenia
         self.operation_history = []
+        self.history_lock = threading.Lock()
+        self._write_seq = 0
+        
+        # Równoległe zapisy do Odoo
+        self.scheduler = WriteScheduler(write_workers) if write_workers else None
+        
+        # Trwały dziennik operacji (do uzgadniania z Odoo)
+        self.journal = OperationJournal(journal) if journal else None
+        self.station = station
+        self.origin_suffix = f' [{station}]' if station else ''
+        
+        # Wejście operatora (podmieniane przy odtwarzaniu sesji)
+        self.input_func = input
+        self._scan_answers = None
         
         # Ścieżki do plików dźwiękowych
         self.sound_paths = sound_paths or {}
@@ -94,8 +630,36 @@ class OdooBarcode:
         self.sound_removed_one = self.sound_paths.get('removed_one', '')
         self.sound_removed_many = self.sound_paths.get('removed_many', '')
         
+        # Wątki do zapytań w tle (np. stan magazynowy tylko do wyświetlenia)
+        self.background = ThreadPoolExecutor(max_workers=2)
+        
         print("✓ Skaner zainicjalizowany dla macOS")
         self.connect()
+        
+        # Nagrywanie sesji
+        self.recorder = None
+        if session_log:
+            try:
+                self.recorder = SessionRecorder(session_log, {
+                    'url': self.url,
+                    'db': self.db,
+                    'loc': self.location_id,
+                })
+                print(f"✓ Nagrywanie sesji: {session_log}")
+            except OSError as e:
+                print(f"⚠ Nie można otworzyć pliku nagrania sesji, skaner działa bez nagrywania: {e}")
+    
+    def ask(self, prompt):
+        """
+        Pyta operatora o dane w trakcie skanu i zapamiętuje odpowiedź do nagrania
+        
+        Args:
+            prompt (str): Treść pytania
+        """
+        answer = self.input_func(prompt)
+        if self._scan_answers is not None:
+            self._scan_answers.append(answer)
+        return answer
     
     def play_sound(self, sound_type):
         """
@@ -151,6 +715,35 @@ class OdooBarcode:
             thread.daemon = True
             thread.start()
     
+    @property
+    def models(self):
+        """
+        Połączenie XML-RPC bieżącego wątku
+        (ServerProxy nie może być współdzielony między wątkami)
+        """
+        proxy = getattr(self._local, 'models', None)
+        if proxy is None:
+            proxy = xmlrpc.client.ServerProxy(f'{self.url}/xmlrpc/2/object')
+            self._local.models = proxy
+        return proxy
+    
+    def write_context(self):
+        """
+        Kontekst Odoo dla create/write/action_* w bieżącym trybie ilości
+        
+        Returns:
+            dict: Kontekst wydajnościowy albo pusty (pełne śledzenie zmian)
+        """
+        # Zapis w tle używa kontekstu z chwili skanu
+        scheduled = getattr(self._local, 'write_context', None)
+        if scheduled is not None:
+            return scheduled
+        
+        quantity_mode = 'multi' if self.multi_mode else 'single'
+        if quantity_mode in self.lean_write_modes:
+            return self.lean_context
+        return {}
+    
     def connect(self):
         """Nawiązuje połączenie z Odoo"""
         try:
@@ -161,18 +754,41 @@ class OdooBarcode:
             if not self.uid:
                 raise Exception("Błąd uwierzytelniania")
             
-            self.models = xmlrpc.client.ServerProxy(f'{self.url}/xmlrpc/2/object')
             print(f"✓ Połączono z Odoo (User ID: {self.uid})")
             
+            # Wczytaj lokalizacje, magazyny i typy operacji
+            self.load_references()
+            
             # Pobierz domyślną lokalizację magazynową
             self.get_default_location()
             
+            # Sprawdź które metody zatwierdzania działają na tym serwerze
+            self.probe_capabilities()
+        
         except Exception as e:
             print(f"✗ Błąd połączenia: {e}")
             sys.exit(1)
     
+    def load_references(self):
+        """Wczytuje dane referencyjne i uruchamia ich odświeżanie w tle"""
+        try:
+            data = self.references.load()
+            print(f"✓ Dane referencyjne: {len(data['internal'])} lokalizacji wewnętrznych "
+                  f"({len(data['barcodes'])} z kodem), {len(data['warehouses'])} magazynów")
+        except Exception as e:
+            print(f"⚠ Nie udało się wczytać danych referencyjnych: {e}")
+        
+        if self.reference_refresh:
+            self.references.start_refresh(self.reference_refresh)
+    
     def get_default_location(self):
         """Pobiera domyślną lokalizację magazynową"""
+        location = self.references.default_location()
+        if location:
+            self.location_id = location['id']
+            print(f"✓ Domyślna lokalizacja: {location['name']} (ID: {self.location_id})")
+            return
+        
         try:
             # Szukaj lokalizacji typu 'internal' (magazyn)
             locations = self.models.execute_kw(
@@ -191,15 +807,152 @@ class OdooBarcode:
         except Exception as e:
             print(f"✗ Błąd pobierania lokalizacji: {e}")
     
+    def _load_capabilities_cache(self):
+        """Wczytuje plik możliwości serwerów (pusty słownik gdy brak)"""
+        if not self.capabilities_cache or not os.path.exists(self.capabilities_cache):
+            return {}
+        try:
+            with open(self.capabilities_cache, encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"⚠ Nie można odczytać pliku możliwości serwera: {e}")
+            return {}
+    
+    def _save_capabilities_cache(self):
+        """Zapisuje możliwości bieżącego serwera do pliku"""
+        if not self.capabilities_cache:
+            return
+        try:
+            with self.capabilities_lock:
+                cache = self._load_capabilities_cache()
+                cache[f'{self.url}|{self.db}'] = self.capabilities
+                directory = os.path.dirname(self.capabilities_cache)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                tmp_path = self.capabilities_cache + '.tmp'
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(cache, f, indent=2)
+                os.replace(tmp_path, self.capabilities_cache)
+        except OSError as e:
+            print(f"⚠ Nie można zapisać pliku możliwości serwera: {e}")
+    
+    @staticmethod
+    def _is_unavailable(error):
+        """Czy błąd oznacza brak metody (a nie problem z danymi)"""
+        return (isinstance(error, xmlrpc.client.Fault)
+                and any(pattern.search(error.faultString) for pattern in UNAVAILABLE_PATTERNS))
+    
+    def probe_capabilities(self):
+        """
+        Sprawdza raz na serwer, które metody zatwierdzania i planowania działają.
+        Metody wywoływane są na pustym zbiorze rekordów, więc niczego nie zmieniają.
+        """
+        cached = self._load_capabilities_cache().get(f'{self.url}|{self.db}')
+        if cached and not self._is_stale(cached):
+            self.capabilities = cached
+            print(f"✓ Metody serwera (zapamiętane): {self._describe_capabilities()}")
+            return
+        
+        capabilities = {}
+        for capability, candidates in CAPABILITY_METHODS.items():
+            capabilities[capability] = 'write'
+            for model, method in candidates:
+                try:
+                    self.models.execute_kw(
+                        self.db, self.uid, self.password,
+                        model, method,
+                        [[]]
+                    )
+                except xmlrpc.client.Fault as e:
+                    # Inny błąd serwera na pustym zbiorze oznacza, że metoda istnieje
+                    if self._is_unavailable(e):
+                        continue
+                except Exception as e:
+                    # Błąd sieci nic nie mówi o metodach - sprawdzimy przy następnym połączeniu
+                    print(f"⚠ Nie udało się sprawdzić metod serwera: {e}")
+                    return
+                capabilities[capability] = method
+                break
+        
+        self.capabilities = capabilities
+        self.capabilities['probed'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        self._save_capabilities_cache()
+        print(f"✓ Metody serwera (sprawdzone): {self._describe_capabilities()}")
+    
+    @staticmethod
+    def _is_stale(capabilities):
+        """Czy zapamiętane metody są starsze niż CAPABILITY_CACHE_MAX_AGE"""
+        try:
+            probed = datetime.strptime(capabilities.get('probed'), "%Y-%m-%d %H:%M:%S")
+        except (TypeError, ValueError):
+            return True
+        return (datetime.now() - probed).total_seconds() > CAPABILITY_CACHE_MAX_AGE
+    
+    def _describe_capabilities(self):
+        return ", ".join(f"{capability}={self.capabilities.get(capability)}"
+                         for capability in CAPABILITY_METHODS)
+    
+    def _remember_capability(self, capability, method):
+        """Zapamiętuje działającą metodę, jeśli różni się od zapisanej"""
+        with self.capabilities_lock:
+            if self.capabilities.get(capability) != method:
+                self.capabilities[capability] = method
+                self._save_capabilities_cache()
+    
+    def call_capability(self, capability, record_ids, fallback):
+        """
+        Wywołuje zapamiętaną metodę dla danej możliwości serwera.
+        Jeśli przestała działać, próbuje kolejnych metod z CAPABILITY_METHODS.
+        
+        Args:
+            capability (str): Klucz z CAPABILITY_METHODS
+            record_ids (dict): ID rekordu dla każdego modelu z listy metod
+            fallback (callable): Ręczne ustawienie stanu, gdy żadna metoda nie zadziała
+        
+        Returns:
+            str: Nazwa metody, która zadziałała ('write' dla fallbacku)
+        """
+        candidates = CAPABILITY_METHODS[capability]
+        methods = [method for _, method in candidates]
+        preferred = self.capabilities.get(capability)
+        # 'write' = żadna metoda nie istnieje (ponowne sprawdzenie przy przeterminowaniu pliku)
+        if preferred == 'write':
+            start = len(candidates)
+        else:
+            start = methods.index(preferred) if preferred in methods else 0
+        
+        # Zapamiętaną metodę zmieniamy tylko gdy poprzednie po prostu nie istnieją,
+        # a nie gdy zawiodły z powodu danych konkretnego dokumentu
+        all_unavailable = True
+        for model, method in candidates[start:]:
+            try:
+                self.models.execute_kw(
+                    self.db, self.uid, self.password,
+                    model, method,
+                    [record_ids[model]],
+                    {'context': self.write_context()}
+                )
+                if all_unavailable:
+                    self._remember_capability(capability, method)
+                return method
+            except Exception as e:
+                all_unavailable = all_unavailable and self._is_unavailable(e)
+        
+        fallback()
+        if all_unavailable:
+            self._remember_capability(capability, 'write')
+        return 'write'
+    
     def find_product_by_barcode(self, barcode):
         """
-        Wyszukuje produkt po kodzie kreskowym i pobiera aktualny stan
+        Wyszukuje produkt po kodzie kreskowym. Aktualny stan ('qty_available')
+        pobierany jest dopiero gdy jest potrzebny - patrz LazyProduct.
         
         Args:
             barcode (str): Kod kreskowy produktu
             
         Returns:
-            dict: Dane produktu lub None
+            LazyProduct: Dane produktu lub None
         """
         try:
             products = self.models.execute_kw(
@@ -211,27 +964,38 @@ class OdooBarcode:
             
             if products:
                 product = products[0]
-                
-                # Pobierz aktualny stan magazynowy dla tej lokalizacji
-                quants = self.models.execute_kw(
-                    self.db, self.uid, self.password,
-                    'stock.quant', 'search_read',
-                    [[['product_id', '=', product['id']], ['location_id', '=', self.location_id]]],
-                    {'fields': ['quantity']}
-                )
-                
-                # Zsumuj ilości ze wszystkich quantów
-                total_qty = sum(quant['quantity'] for quant in quants)
-                product['qty_available'] = total_qty
-                
-                return product
+                location_id = self.location_id
+                return LazyProduct(product, lambda: self.get_stock_quantity(product['id'], location_id))
             return None
             
         except Exception as e:
             print(f"✗ Błąd wyszukiwania produktu: {e}")
             return None
     
-    def add_to_history(self, operation_type, operation_id, product_name, quantity):
+    def get_stock_quantity(self, product_id, location_id):
+        """
+        Pobiera aktualny stan magazynowy produktu w lokalizacji
+        
+        Returns:
+            float: Suma ilości ze wszystkich quantów lub None przy błędzie
+        """
+        try:
+            quants = self.models.execute_kw(
+                self.db, self.uid, self.password,
+                'stock.quant', 'search_read',
+                [[['product_id', '=', product_id], ['location_id', '=', location_id]]],
+                {'fields': ['quantity']}
+            )
+            
+            # Zsumuj ilości ze wszystkich quantów
+            return sum(quant['quantity'] for quant in quants)
+            
+        except Exception as e:
+            print(f"✗ Błąd pobierania stanu magazynowego: {e}")
+            return None
+    
+    def add_to_history(self, operation_type, operation_id, product_name, quantity,
+                       product_id=None, origin=None):
         """
         Dodaje operację do historii dla możliwości cofnięcia
         
@@ -240,18 +1004,42 @@ class OdooBarcode:
             operation_id (int): ID operacji w Odoo
             product_name (str): Nazwa produktu
             quantity (float): Ilość
+            product_id (int): ID produktu (do dziennika operacji)
+            origin (str): Pole 'origin' dokumentu w Odoo (do dziennika operacji)
         """
-        self.operation_history.append({
+        entry = {
             'type': operation_type,
             'id': operation_id,
             'product_name': product_name,
             'quantity': quantity,
-            'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        })
+            'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            'seq': getattr(self._local, 'write_seq', None)
+        }
+        with self.history_lock:
+            # Zapisy w tle kończą się w dowolnej kolejności - wstaw według kolejności skanów
+            position = len(self.operation_history)
+            if entry['seq'] is not None:
+                while position > 0 and (self.operation_history[position - 1]['seq'] or 0) > entry['seq']:
+                    position -= 1
+            self.operation_history.insert(position, entry)
+            
+            # Zachowaj tylko ostatnie 10 operacji
+            if len(self.operation_history) > 10:
+                self.operation_history.pop(0)
         
-        # Zachowaj tylko ostatnie 10 operacji
-        if len(self.operation_history) > 10:
-            self.operation_history.pop(0)
+        scan_ops = getattr(self._local, 'scan_ops', None)
+        if scan_ops is not None:
+            scan_ops.append([operation_type, operation_id, quantity])
+        if self.journal:
+            self.journal.write({
+                'type': operation_type,
+                'id': operation_id,
+                'product_id': product_id,
+                'qty': quantity,
+                'origin': origin,
+                'db': self.db,
+                'station': self.station,
+            })
     
     def undo_last_operation(self):
         """
@@ -261,7 +1049,11 @@ class OdooBarcode:
             print("⚠ Brak operacji do cofnięcia")
             return False
         
-        last_op = self.operation_history.pop()
+        with self.history_lock:
+            last_op = self.operation_history.pop()
+        scan_ops = getattr(self._local, 'scan_ops', None)
+        if scan_ops is not None:
+            scan_ops.append(['undo', last_op['id'], last_op['quantity']])
         
         try:
             if last_op['type'] == 'production':
@@ -271,7 +1063,8 @@ class OdooBarcode:
                     self.models.execute_kw(
                         self.db, self.uid, self.password,
                         'mrp.production', 'action_cancel',
-                        [last_op['id']]
+                        [last_op['id']],
+                        {'context': self.write_context()}
                     )
                     print(f" Cofnięto produkcję: {last_op['quantity']} szt. {last_op['product_name']}")
                 except:
@@ -279,7 +1072,8 @@ class OdooBarcode:
                     self.models.execute_kw(
                         self.db, self.uid, self.password,
                         'mrp.production', 'write',
-                        [last_op['id'], {'state': 'cancel'}]
+                        [last_op['id'], {'state': 'cancel'}],
+                        {'context': self.write_context()}
                     )
                     print(f" Anulowano produkcję: {last_op['quantity']} szt. {last_op['product_name']}")
                 
@@ -290,7 +1084,8 @@ class OdooBarcode:
                     self.models.execute_kw(
                         self.db, self.uid, self.password,
                         'stock.picking', 'action_cancel',
-                        [last_op['id']]
+                        [last_op['id']],
+                        {'context': self.write_context()}
                     )
                     operation_name = "przyjęcie" if last_op['type'] == 'stock_move_in' else "wydanie"
                     print(f" Cofnięto {operation_name}: {last_op['quantity']} szt. {last_op['product_name']}")
@@ -299,20 +1094,33 @@ class OdooBarcode:
                     self.models.execute_kw(
                         self.db, self.uid, self.password,
                         'stock.picking', 'write',
-                        [last_op['id'], {'state': 'cancel'}]
+                        [last_op['id'], {'state': 'cancel'}],
+                        {'context': self.write_context()}
                     )
                     operation_name = "przyjęcie" if last_op['type'] == 'stock_move_in' else "wydanie"
                     print(f" Anulowano {operation_name}: {last_op['quantity']} szt. {last_op['product_name']}")
             
+            if self.journal:
+                self.journal.write({
+                    'type': 'undo',
+                    'undo_type': last_op['type'],
+                    'id': last_op['id'],
+                    'db': self.db,
+                    'station': self.station,
+                })
+            
             return True
             
         except Exception as e:
             print(f"✗ Błąd cofania operacji: {e}")
             # Przywróć operację do historii jeśli cofnięcie się nie powiodło
-            self.operation_history.append(last_op)
+            with self.history_lock:
+                self.operation_history.append(last_op)
+            if scan_ops:
+                scan_ops.pop()
             return False
     
-    def create_production_order(self, product_id, bom_id, quantity):
+    def create_production_order(self, product_id, bom_id, quantity, location_id=None):
         """
         Tworzy zlecenie produkcyjne w Odoo
         
@@ -320,7 +1128,9 @@ class OdooBarcode:
             product_id (int): ID produktu do wyprodukowania
             bom_id (int): ID BOM (Bill of Materials)
             quantity (float): Ilość do wyprodukowania
+            location_id (int): Lokalizacja magazynowa (domyślnie bieżąca lokalizacja skanera)
         """
+        location_id = location_id or self.location_id
         try:
             # Pobierz informacje o produkcie
             product_info = self.models.execute_kw(
@@ -337,14 +1147,15 @@ class OdooBarcode:
             product_uom = product_info[0]['uom_id'][0] if product_info[0]['uom_id'] else 1
             
             # Tworzymy zlecenie produkcyjne
+            origin = f'Skaner - Produkcja - {datetime.now().strftime("%Y-%m-%d %H:%M:%S")}{self.origin_suffix}'
             production_vals = {
                 'product_id': product_id,
                 'product_qty': quantity,
                 'product_uom_id': product_uom,
                 'bom_id': bom_id,
-                'location_src_id': self.location_id,  # Lokalizacja surowców
-                'location_dest_id': self.location_id,  # Lokalizacja produktów gotowych
-                'origin': f'Skaner - Produkcja - {datetime.now().strftime("%Y-%m-%d %H:%M:%S")}',
+                'location_src_id': location_id,  # Lokalizacja surowców
+                'location_dest_id': location_id,  # Lokalizacja produktów gotowych
+                'origin': origin,
                 'state': 'draft',
             }
             
@@ -352,14 +1163,16 @@ class OdooBarcode:
             production_id = self.models.execute_kw(
                 self.db, self.uid, self.password,
                 'mrp.production', 'create',
-                [production_vals]
+                [production_vals],
+                {'context': self.write_context()}
             )
             
             # Potwierdź zlecenie
             self.models.execute_kw(
                 self.db, self.uid, self.password,
                 'mrp.production', 'action_confirm',
-                [production_id]
+                [production_id],
+                {'context': self.write_context()}
             )
             
             # Przypisz dostępność surowców
@@ -367,32 +1180,31 @@ class OdooBarcode:
                 self.models.execute_kw(
                     self.db, self.uid, self.password,
                     'mrp.production', 'action_assign',
-                    [production_id]
+                    [production_id],
+                    {'context': self.write_context()}
                 )
             except Exception as e:
                 print(f"⚠ Nie udało się przypisać surowców: {e}")
             
             # Rozpocznij produkcję
-            try:
-                self.models.execute_kw(
-                    self.db, self.uid, self.password,
-                    'mrp.production', 'button_plan',
-                    [production_id]
-                )
-            except:
+            def set_progress():
                 # Fallback - ustaw stan na 'progress'
                 self.models.execute_kw(
                     self.db, self.uid, self.password,
                     'mrp.production', 'write',
-                    [production_id, {'state': 'progress'}]
+                    [production_id, {'state': 'progress'}],
+                    {'context': self.write_context()}
                 )
             
+            self.call_capability('plan_production', {'mrp.production': production_id}, set_progress)
+            
             # Zakończ produkcję automatycznie
             try:
                 self.models.execute_kw(
                     self.db, self.uid, self.password,
                     'mrp.production', 'button_mark_done',
-                    [production_id]
+                    [production_id],
+                    {'context': self.write_context()}
                 )
                 print(f"Zlecenie produkcyjne {production_id} ukończone!")
             except Exception as e:
@@ -402,7 +1214,8 @@ class OdooBarcode:
             print(f"Wyprodukowano {quantity} szt. {product_name}")
             
             # Dodaj do historii
-            self.add_to_history('production', production_id, product_name, quantity)
+            self.add_to_history('production', production_id, product_name, quantity,
+                                product_id, origin)
             
             return True
             
@@ -412,7 +1225,7 @@ class OdooBarcode:
             print(f"Szczegóły błędu: {traceback.format_exc()}")
             return False
     
-    def create_stock_move(self, product_id, quantity, move_type='in'):
+    def create_stock_move(self, product_id, quantity, move_type='in', location_id=None):
         """
         Tworzy przyjęcie lub wydanie w Odoo - wersja uproszczona
         
@@ -420,19 +1233,21 @@ class OdooBarcode:
             product_id (int): ID produktu
             quantity (float): Ilość
             move_type (str): 'in' dla przyjęcia, 'out' dla wydania
+            location_id (int): Lokalizacja magazynowa (domyślnie bieżąca lokalizacja skanera)
         """
+        location_id = location_id or self.location_id
         try:
             if move_type == 'in':
                 # PRZYJĘCIE - z lokalizacji dostawcy do magazynu
                 source_location = self.get_supplier_location()
-                dest_location = self.location_id
-                picking_type = self.get_picking_type('incoming')
+                dest_location = location_id
+                picking_type = self.get_picking_type('incoming', location_id)
                 operation_name = "Przyjęcie"
             else:
                 # WYDANIE - z magazynu do lokalizacji klienta
-                source_location = self.location_id
+                source_location = location_id
                 dest_location = self.get_customer_location()
-                picking_type = self.get_picking_type('outgoing')
+                picking_type = self.get_picking_type('outgoing', location_id)
                 operation_name = "Wydanie"
             
             # Pobierz informacje o produkcie dla jednostki miary
@@ -444,18 +1259,20 @@ class OdooBarcode:
             product_uom = product_info[0]['uom_id'][0] if product_info[0]['uom_id'] else 1
             
             # Tworzymy dokument magazynowy (picking)
+            origin = f'Skaner - {operation_name} - {datetime.now().strftime("%Y-%m-%d %H:%M:%S")}{self.origin_suffix}'
             picking_vals = {
                 'picking_type_id': picking_type,
                 'location_id': source_location,
                 'location_dest_id': dest_location,
-                'origin': f'Skaner - {operation_name} - {datetime.now().strftime("%Y-%m-%d %H:%M:%S")}',
+                'origin': origin,
                 'state': 'draft',
             }
             
             picking_id = self.models.execute_kw(
                 self.db, self.uid, self.password,
                 'stock.picking', 'create',
-                [picking_vals]
+                [picking_vals],
+                {'context': self.write_context()}
             )
             
             # Tworzymy linię ruchu magazynowego
@@ -473,64 +1290,53 @@ class OdooBarcode:
             move_id = self.models.execute_kw(
                 self.db, self.uid, self.password,
                 'stock.move', 'create',
-                [move_vals]
+                [move_vals],
+                {'context': self.write_context()}
             )
             
             # Potwierdzamy dokument
             self.models.execute_kw(
                 self.db, self.uid, self.password,
                 'stock.picking', 'action_confirm',
-                [picking_id]
+                [picking_id],
+                {'context': self.write_context()}
             )
             
             # Ustawmy na ruch magazynowy, że ma być "dostępny"
             self.models.execute_kw(
                 self.db, self.uid, self.password,
                 'stock.move', 'write',
-                [move_id, {'state': 'assigned'}]
+                [move_id, {'state': 'assigned'}],
+                {'context': self.write_context()}
             )
             
-            # Użyj metody _action_done bezpośrednio na ruchu
-            try:
+            # Zatwierdź metodą, która działa na tym serwerze
+            # (_action_done, action_done, button_validate - patrz CAPABILITY_METHODS)
+            def set_done():
+                # Ostateczny fallback - ustaw stany ręcznie
                 self.models.execute_kw(
                     self.db, self.uid, self.password,
-                    'stock.move', '_action_done',
-                    [move_id]
+                    'stock.picking', 'write',
+                    [picking_id, {'state': 'done'}],
+                    {'context': self.write_context()}
+                )
+                self.models.execute_kw(
+                    self.db, self.uid, self.password,
+                    'stock.move', 'write',
+                    [move_id, {'state': 'done'}],
+                    {'context': self.write_context()}
                 )
-            except:
-                # Fallback - spróbuj z action_done na stock.move
-                try:
-                    self.models.execute_kw(
-                        self.db, self.uid, self.password,
-                        'stock.move', 'action_done',
-                        [move_id]
-                    )
-                except:
-                    # Fallback - użyj button_validate na picking
-                    try:
-                        self.models.execute_kw(
-                            self.db, self.uid, self.password,
-                            'stock.picking', 'button_validate',
-                            [picking_id]
-                        )
-                    except:
-                        # Ostateczny fallback - ustaw stany ręcznie
-                        self.models.execute_kw(
-                            self.db, self.uid, self.password,
-                            'stock.picking', 'write',
-                            [picking_id, {'state': 'done'}]
-                        )
-                        self.models.execute_kw(
-                            self.db, self.uid, self.password,
-                            'stock.move', 'write',
-                            [move_id, {'state': 'done'}]
-                        )
+            
+            self.call_capability('validate_move',
+                                 {'stock.move': move_id, 'stock.picking': picking_id},
+                                 set_done)
             
             print(f"📋 Utworzono dokument {operation_name} ID: {picking_id}")
             
             # Dodaj do historii
             history_type = 'stock_move_in' if move_type == 'in' else 'stock_move_out'
-            self.add_to_history(history_type, picking_id, product_info[0]['name'], quantity)
+            self.add_to_history(history_type, picking_id, product_info[0]['name'], quantity,
+                                product_id, origin)
             
             return True
             
@@ -543,6 +1349,10 @@ class OdooBarcode:
     
     def get_supplier_location(self):
         """Pobiera ID lokalizacji dostawcy"""
+        location = self.references.partner_location('supplier')
+        if location:
+            return location
+        
         try:
             locations = self.models.execute_kw(
                 self.db, self.uid, self.password,
@@ -556,6 +1366,10 @@ class OdooBarcode:
     
     def get_customer_location(self):
         """Pobiera ID lokalizacji klienta"""
+        location = self.references.partner_location('customer')
+        if location:
+            return location
+        
         try:
             locations = self.models.execute_kw(
                 self.db, self.uid, self.password,
@@ -567,13 +1381,18 @@ class OdooBarcode:
         except:
             return 9
     
-    def get_picking_type(self, operation_type):
+    def get_picking_type(self, operation_type, location_id=None):
         """
         Pobiera typ operacji magazynowej
         
         Args:
             operation_type (str): 'incoming' lub 'outgoing'
+            location_id (int): Lokalizacja magazynowa (wybiera typ operacji jej magazynu)
         """
+        picking_type = self.references.picking_type(operation_type, location_id)
+        if picking_type:
+            return picking_type
+        
         try:
             picking_types = self.models.execute_kw(
                 self.db, self.uid, self.password,
@@ -591,20 +1410,42 @@ class OdooBarcode:
         
         Args:
             barcode (str): Kod kreskowy
+            
+        Returns:
+            str: Wynik obsługi skanu (np. 'added', 'removed', 'not_found')
         """
         barcode = barcode.strip()
+        mode, multi_mode = self.mode, self.multi_mode
+        
+        self._scan_answers = []
+        self._local.scan_ops = []
+        started = time.monotonic()
+        outcome = 'exception'
+        try:
+            outcome = self._handle_barcode(barcode)
+        finally:
+            duration = time.monotonic() - started
+            if self.recorder:
+                self.recorder.record(barcode, mode, multi_mode, self._scan_answers,
+                                     outcome, duration, self._local.scan_ops)
+            self._scan_answers = None
+            self._local.scan_ops = None
         
+        return outcome
+    
+    def _handle_barcode(self, barcode):
+        """Obsługa skanu - zwraca krótki kod wyniku do nagrania sesji"""
         # Sprawdź czy to kod przełączania trybu
         if barcode == self.ADD_MODE_BARCODE:
             self.mode = 'add'
             print(" Tryb: DODAWANIE towarów")
             self.play_sound('add_mode')  # Odtwórz dźwięk trybu dodawania
-            return
+            return 'mode'
         elif barcode == self.REMOVE_MODE_BARCODE:
             self.mode = 'remove'
             print(" Tryb: ZDEJMOWANIE towarów")
             self.play_sound('remove_mode')  # Odtwórz dźwięk trybu zdejmowania
-            return
+            return 'mode'
         elif barcode == self.MULTI_MODE_BARCODE:
             self.multi_mode = not self.multi_mode  # Przełącz tryb wielokrotności
             if self.multi_mode:
@@ -613,87 +1454,179 @@ class OdooBarcode:
             else:
                 print("Tryb POJEDYNCZY: Domyślnie 1 sztuka")
                 self.play_sound('single_mode')  # Dźwięk trybu pojedynczego
-            return
+            return 'mode'
         elif barcode == self.UNDO_BARCODE:
-            # Cofnij ostatnią operację
-            success = self.undo_last_operation()
-            if success:
-                remaining = len(self.operation_history)
-                print(f" Pozostało {remaining} operacji do cofnięcia")
-            return
+            # Cofnij ostatnią operację (po zakończeniu wszystkich wcześniejszych zapisów)
+            def undo():
+                success = self.undo_last_operation()
+                if success:
+                    remaining = len(self.operation_history)
+                    print(f" Pozostało {remaining} operacji do cofnięcia")
+                return success
+            
+            return self.schedule_write(barcode, None, undo, 'undo', 'undo_failed', barrier=True)
+        
+        # Kod lokalizacji - przełącz lokalizację stanowiska (bez zapytania do Odoo)
+        location = self.references.location_by_barcode(barcode)
+        if location:
+            self.location_id = location['id']
+            print(f" Lokalizacja: {location['complete_name'] or location['name']} (ID: {self.location_id})")
+            return 'location'
         
         # Sprawdź czy tryb został ustawiony
         if not self.mode:
             print("Najpierw zeskanuj kod wyboru trybu!")
-            return
+            return 'no_mode'
         
         # Wyszukaj produkt
         product = self.find_product_by_barcode(barcode)
         if not product:
             print(f"Nie znaleziono produktu o kodzie: {barcode}")
-            return
+            return 'not_found'
+        
+        # Przy zdejmowaniu poczekaj na zgłoszone zapisy tego produktu, zanim stan
+        # zostanie pobrany (wyświetlenie lub sprawdzenie dostępności) - inaczej byłby nieaktualny
+        if self.mode == 'remove' and self.scheduler:
+            self.scheduler.wait_for(product['id'])
         
         # Pobierz ilość do przetworzenia
         if self.multi_mode:
             # Tryb wielokrotności - pytaj o ilość
             try:
-                quantity = float(input(f"Podaj ilość dla {product['name']}: "))
+                quantity = float(self.ask(f"Podaj ilość dla {product['name']}: "))
                 if quantity <= 0:
                     print("Ilość musi być większa od 0")
-                    return
+                    return 'bad_qty'
             except ValueError:
                 print("Nieprawidłowa ilość")
-                return
+                return 'bad_qty'
         else:
             # Tryb pojedynczy - domyślnie 1 sztuka
             quantity = 1.0
-            print(f"{product['name']} - ilość: {quantity} szt. (dostępne: {product['qty_available']} szt.)")
+            if self.mode == 'remove':
+                print(f"{product['name']} - ilość: {quantity} szt. (dostępne: {product['qty_available']} szt.)")
+            else:
+                # Stan tylko do wyświetlenia - pobierany w tle, nie opóźnia przyjęcia
+                product.prefetch(self.background)
+                print(f"{product['name']} - ilość: {quantity} szt.")
+        
+        # Zapis w tle trafia do lokalizacji z chwili skanu
+        location_id = self.location_id
         
         # Wykonaj operację magazynową
         if self.mode == 'add':
             # Sprawdź czy to produkt produkcyjny
             if barcode in self.PRODUCTION_PRODUCTS:
                 bom_id = self.PRODUCTION_PRODUCTS[barcode]
-                success = self.create_production_order(product['id'], bom_id, quantity)
-                if success:
-                    print(f"Rozpoczęto produkcję {quantity} szt. {product['name']}")
-                    # Odtwórz odpowiedni dźwięk dodawania
-                    if quantity == 1:
-                        self.play_sound('added_one')
+                
+                def produce():
+                    success = self.create_production_order(product['id'], bom_id, quantity, location_id)
+                    if success:
+                        print(f"Rozpoczęto produkcję {quantity} szt. {product['name']}")
+                        self._print_stock_before(product)
+                        # Odtwórz odpowiedni dźwięk dodawania
+                        if quantity == 1:
+                            self.play_sound('added_one')
+                        else:
+                            self.play_sound('added_many')
                     else:
-                        self.play_sound('added_many')
-                else:
-                    print(f"✗ Błąd uruchomienia produkcji")
+                        print(f"✗ Błąd uruchomienia produkcji")
+                    return success
+                
+                return self.schedule_write(barcode, product['id'], produce, 'produced')
             else:
                 # Zwykłe przyjęcie towaru
-                success = self.create_stock_move(product['id'], quantity, 'in')
-                if success:
-                    print(f"Dodano {quantity} szt. {product['name']}")
-                    # Odtwórz odpowiedni dźwięk dodawania
-                    if quantity == 1:
-                        self.play_sound('added_one')
+                def receive():
+                    success = self.create_stock_move(product['id'], quantity, 'in', location_id)
+                    if success:
+                        print(f"Dodano {quantity} szt. {product['name']}")
+                        self._print_stock_before(product)
+                        # Odtwórz odpowiedni dźwięk dodawania
+                        if quantity == 1:
+                            self.play_sound('added_one')
+                        else:
+                            self.play_sound('added_many')
                     else:
-                        self.play_sound('added_many')
-                else:
-                    print(f"Błąd dodawania towaru")
+                        print(f"Błąd dodawania towaru")
+                    return success
+                
+                return self.schedule_write(barcode, product['id'], receive, 'added')
         elif self.mode == 'remove':
-            # Sprawdź dostępność towaru
-            if product['qty_available'] < quantity:
-                print(f"Niewystarczająca ilość w magazynie. Dostępne: {product['qty_available']}")
-                confirm = input("Czy kontynuować? (t/n): ")
+            # Sprawdź dostępność towaru (tu stan jest pobierany, jeśli jeszcze go nie ma)
+            available = product['qty_available']
+            if available is None or available < quantity:
+                if available is None:
+                    print("Nie udało się sprawdzić stanu magazynowego")
+                else:
+                    print(f"Niewystarczająca ilość w magazynie. Dostępne: {available}")
+                confirm = self.ask("Czy kontynuować? (t/n): ")
                 if confirm.lower() not in ['t', 'tak', 'y', 'yes']:
-                    return
+                    return 'cancelled'
             
-            success = self.create_stock_move(product['id'], quantity, 'out')
-            if success:
-                print(f"Zdjęto {quantity} szt. {product['name']}")
-                # Odtwórz odpowiedni dźwięk zdejmowania
-                if quantity == 1:
-                    self.play_sound('removed_one')
+            def issue():
+                success = self.create_stock_move(product['id'], quantity, 'out', location_id)
+                if success:
+                    print(f"Zdjęto {quantity} szt. {product['name']}")
+                    # Odtwórz odpowiedni dźwięk zdejmowania
+                    if quantity == 1:
+                        self.play_sound('removed_one')
+                    else:
+                        self.play_sound('removed_many')
                 else:
-                    self.play_sound('removed_many')
-            else:
-                print(f"✗ Błąd zdejmowania towaru")
+                    print(f"✗ Błąd zdejmowania towaru")
+                return success
+            
+            return self.schedule_write(barcode, product['id'], issue, 'removed')
+    
+    def schedule_write(self, barcode, key, write, outcome, failed_outcome='error', barrier=False):
+        """
+        Wykonuje zapis od razu albo zgłasza go do harmonogramu zapisów.
+        Zapis w tle dostaje kontekst i kolejność z chwili skanu.
+        
+        Args:
+            barcode (str): Zeskanowany kod (do nagrania sesji)
+            key: Klucz kolejności zapisów (ID produktu)
+            write (callable): Zapis zwracający True przy powodzeniu
+            outcome (str): Wynik skanu przy powodzeniu
+            failed_outcome (str): Wynik skanu przy błędzie
+            barrier (bool): Czy zapis musi być odizolowany od wszystkich innych (cofnięcie)
+            
+        Returns:
+            str: Wynik skanu (dla zapisu w tle - wynik zgłoszenia)
+        """
+        if not self.scheduler:
+            return outcome if write() else failed_outcome
+        
+        context = self.write_context()
+        with self.history_lock:
+            self._write_seq += 1
+            seq = self._write_seq
+        
+        def job():
+            self._local.write_context = context
+            self._local.write_seq = seq
+            self._local.scan_ops = []
+            started = time.monotonic()
+            success = False
+            try:
+                success = write()
+            finally:
+                if self.recorder:
+                    self.recorder.record_write(barcode, outcome if success else failed_outcome,
+                                               time.monotonic() - started, self._local.scan_ops)
+                self._local.write_context = None
+                self._local.write_seq = None
+                self._local.scan_ops = None
+            return success
+        
+        self.scheduler.submit(key, job, barrier)
+        return outcome
+    
+    def _print_stock_before(self, product):
+        """Wypisuje stan sprzed skanu, jeśli pobieranie w tle zdążyło się zakończyć"""
+        qty = product.qty_if_ready()
+        if qty is not None:
+            print(f"   (stan przed skanem: {qty} szt.)")
     
     def run(self):
         """Główna pętla programu"""
@@ -704,6 +1637,7 @@ class OdooBarcode:
         print(f"Kod zdejmowania: {self.REMOVE_MODE_BARCODE}")
         print(f"Kod wielokrotności: {self.MULTI_MODE_BARCODE}")
         print(f"Kod cofania: {self.UNDO_BARCODE}")
+        print("Kod lokalizacji → przełącza lokalizację stanowiska")
         print("Tryby:")
         print("• Domyślnie: 1 sztuka na skan")
         print("• 'wiele' → pytaj o ilość")
@@ -716,7 +1650,14 @@ class OdooBarcode:
         
         while True:
             try:
-                barcode = input("\nZeskanuj kod kreskowy: ").strip()
+                # Liczba zapisów wciąż wykonywanych w tle
+                pending = ""
+                if self.scheduler:
+                    in_flight = self.scheduler.in_flight
+                    if in_flight:
+                        pending = f" [w toku: {in_flight}]"
+                
+                barcode = input(f"\nZeskanuj kod kreskowy{pending}: ").strip()
                 
                 if barcode.lower() in ['exit', 'quit', 'wyjście']:
                     print(" Zamykanie programu...")
@@ -732,6 +1673,23 @@ class OdooBarcode:
                 break
             except Exception as e:
                 print(f"Nieoczekiwany błąd: {e}")
+        
+        self.finish_writes()
+        self.references.stop()
+        
+        if self.recorder:
+            self.recorder.close()
+    
+    def finish_writes(self):
+        """Czeka na zapisy w tle i wypisuje ich podsumowanie"""
+        if not self.scheduler:
+            return
+        in_flight = self.scheduler.in_flight
+        if in_flight:
+            print(f" Czekam na zakończenie {in_flight} zapisów...")
+        self.scheduler.drain()
+        stats = self.scheduler.stats()
+        print(f" Zapisy: {stats['completed']} wykonanych, {stats['failed']} z błędem")
 
 def main():
     """Funkcja główna"""
@@ -800,8 +1758,25 @@ def main():
         elif sound_item_removed:
             print(f"Nie znaleziono pliku: {sound_item_removed}")
     
+    # Nagrywanie sesji
+    session_log = None
+    if CONFIG.get('session_log'):
+        session_log = os.path.expanduser(f"~/{datetime.now().strftime(CONFIG['session_log'])}")
+    
+    capabilities_cache = None
+    if CONFIG.get('capabilities_cache'):
+        capabilities_cache = os.path.expanduser(f"~/{CONFIG['capabilities_cache']}")
+    
+    journal = None
+    if CONFIG.get('journal'):
+        journal = os.path.expanduser(f"~/{CONFIG['journal']}")
+    
     # Uruchom skaner
-    scanner = OdooBarcode(URL, DB, USERNAME, PASSWORD, sound_paths)
+    scanner = OdooBarcode(URL, DB, USERNAME, PASSWORD, sound_paths, session_log,
+                          capabilities_cache, journal,
+                          CONFIG.get('write_context'), CONFIG.get('lean_write_modes'),
+                          CONFIG.get('write_workers', 0), CONFIG.get('reference_refresh', 0),
+                          station_name())
     scanner.run()
 
 if __name__ == "__main__":
@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Testy sprawdzania stanu przy zdejmowaniu z zapisami w tle (lokalny serwer zastępczy)
+"""
+
+import contextlib
+import io
+import unittest
+
+from skaner import OdooBarcode
+from odoo_standin import OdooStandIn
+
+
+class RemoveModeTest(unittest.TestCase):
+    def setUp(self):
+        self.standin = OdooStandIn(['111'], latency=0.05, stock=1.0).start()
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.scanner = OdooBarcode(self.standin.url, 'standin', 'admin', 'admin', write_workers=4)
+        self.prompts = []
+        self.scanner.input_func = self.answer
+
+    def tearDown(self):
+        self.scanner.finish_writes()
+        self.standin.stop()
+
+    def answer(self, prompt):
+        self.prompts.append(prompt)
+        return 'n'
+
+    def test_second_single_removal_sees_first_write(self):
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.assertEqual(self.scanner.process_barcode('zdejmujetowar'), 'mode')
+            self.assertEqual(self.scanner.process_barcode('111'), 'removed')
+            self.assertEqual(self.scanner.process_barcode('111'), 'cancelled')
+            self.scanner.scheduler.drain()
+
+        self.assertEqual(self.prompts, ["Czy kontynuować? (t/n): "])
+        moves = [m for m in self.standin.records['stock.move'].values() if m.get('state') == 'done']
+        self.assertEqual(len(moves), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Testy kolejności zapisów w WriteScheduler
+"""
+
+import threading
+import time
+import unittest
+
+from skaner import WriteScheduler
+
+
+class WriteSchedulerTest(unittest.TestCase):
+    def setUp(self):
+        self.scheduler = WriteScheduler(4)
+        self.events = []
+        self.events_lock = threading.Lock()
+
+    def tearDown(self):
+        self.scheduler.drain()
+        self.scheduler.executor.shutdown()
+
+    def job(self, name, duration=0.0):
+        def run():
+            with self.events_lock:
+                self.events.append(('start', name))
+            time.sleep(duration)
+            with self.events_lock:
+                self.events.append(('end', name))
+            return True
+        return run
+
+    def test_submit_after_barrier_started_waits(self):
+        barrier = self.scheduler.submit(None, self.job('undo', 0.3), barrier=True)
+        time.sleep(0.1)
+        later = self.scheduler.submit(2, self.job('scan'))
+
+        later.result(timeout=5)
+        self.assertTrue(barrier.done())
+        self.assertEqual(self.events, [('start', 'undo'), ('end', 'undo'),
+                                       ('start', 'scan'), ('end', 'scan')])
+
+    def test_barrier_waits_for_earlier_jobs(self):
+        self.scheduler.submit(1, self.job('first', 0.2))
+        self.scheduler.submit(2, self.job('second', 0.1))
+        self.scheduler.submit(None, self.job('undo'), barrier=True).result(timeout=5)
+
+        self.assertEqual(self.events[-2:], [('start', 'undo'), ('end', 'undo')])
+
+    def test_same_key_runs_in_order(self):
+        self.scheduler.submit(1, self.job('a', 0.1))
+        self.scheduler.submit(1, self.job('b'))
+        self.scheduler.drain()
+
+        self.assertEqual(self.events, [('start', 'a'), ('end', 'a'), ('start', 'b'), ('end', 'b')])
+
+
+if __name__ == "__main__":
+    unittest.main()